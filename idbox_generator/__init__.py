@@ -1,11 +1,47 @@
-from . import types
-from .generate import create_svg_from_params
-from .converter import convert_svg_to_png
-from .schema_handler import parse_schema_to_svg_params
+import importlib
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from . import types
+    from .generate import create_svg_from_params, render_to_bytes, render_to_stream
+    from .converter import convert_svg_to_png
+    from .schema_handler import parse_schema_to_svg_params
+    from .template_cache import register_template, template_cache_stats
+
+# attributes are imported on first access (PEP 562), so that importing the
+# package does not load jinja2, pylibdmtx or numpy until they are needed
+_LAZY_ATTRIBUTES = {
+    "create_svg_from_params": ".generate",
+    "render_to_bytes": ".generate",
+    "render_to_stream": ".generate",
+    "convert_svg_to_png": ".converter",
+    "parse_schema_to_svg_params": ".schema_handler",
+    "register_template": ".template_cache",
+    "template_cache_stats": ".template_cache",
+}
 
 __all__ = [
     "types",
     "create_svg_from_params",
+    "render_to_bytes",
+    "render_to_stream",
     "convert_svg_to_png",
     "parse_schema_to_svg_params",
+    "register_template",
+    "template_cache_stats",
 ]
+
+
+def __getattr__(name):
+    if name == "types":
+        return importlib.import_module(".types", __name__)
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
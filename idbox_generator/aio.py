@@ -0,0 +1,149 @@
+import asyncio
+import functools
+import os
+import weakref
+from concurrent.futures import Executor
+from typing import Optional, Union
+
+from .backends import RASTER_BACKEND
+from .types import IdBoxSchema, SvgParams
+
+# maximum number of boxes rendered at once by the default renderer of a loop
+ENV_CONCURRENCY = "IDBOX_ASYNC_CONCURRENCY"
+
+
+class AsyncRenderer:
+    """Renders boxes without blocking the event loop.
+
+    Local inkscape runs through asyncio.create_subprocess_exec, and everything
+    CPU-bound or still blocking (parsing, Jinja, cairo, raster, the inkscape
+    pool and docker) runs in `executor`, the loop's default thread pool if
+    None. At most `concurrency` renders run at once, the others wait.
+    """
+
+    def __init__(
+        self, concurrency: Optional[int] = None, executor: Optional[Executor] = None
+    ):
+        if concurrency is None:
+            concurrency = int(os.environ.get(ENV_CONCURRENCY, 0)) or os.cpu_count() or 1
+        self.concurrency = concurrency
+        self.executor = executor
+        # one semaphore per event loop, see _semaphore
+        self._semaphores = weakref.WeakKeyDictionary()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        # created in the running loop, which python 3.9 binds a semaphore to on
+        # creation, so that a renderer made before asyncio.run works in any loop
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.concurrency)
+        return semaphore
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def render(
+        self,
+        schema: Union[SvgParams, IdBoxSchema, dict],
+        format: str = "svg",
+        dpi: int = 300,
+        use_local: bool = True,
+        use_pool: bool = False,
+        backend: Optional[str] = None,
+    ) -> bytes:
+        """Same as generate.render_to_bytes, from params, a schema or its JSON data."""
+        async with self._semaphore():
+            params = schema
+            if not isinstance(schema, SvgParams):
+                params = await self._run(_parse_params, schema)
+            if backend == RASTER_BACKEND and format == "png":
+                from .raster import convert_params_to_png
+
+                return await self._run(convert_params_to_png, params)
+
+            from .generate import create_svg_from_params
+
+            content_svg = await self._run(create_svg_from_params, params)
+            return await self.convert(
+                content_svg, format, dpi, use_local, use_pool, backend
+            )
+
+    async def convert(
+        self,
+        content_svg: str,
+        extension: str,
+        dpi: int = 300,
+        use_local: bool = True,
+        use_pool: bool = False,
+        backend: Optional[str] = None,
+    ) -> bytes:
+        """Same as save_to.svg_to_bytes, see render."""
+        from . import backends
+
+        # auto may ping docker, which blocks
+        backend = await self._run(
+            backends.resolve_backend, extension, backend, use_local, use_pool
+        )
+        if backend is None:
+            return content_svg.encode()
+        if backend == "inkscape":
+            if extension == "jpg":
+                content_png = await convert_inkscape(content_svg, "png", dpi)
+                return await self._run(backends._png_to_jpg, content_png)
+            return await convert_inkscape(content_svg, extension, dpi)
+        return await self._run(
+            backends.convert, content_svg, extension, dpi=dpi, backend=backend
+        )
+
+
+def _parse_params(schema: Union[IdBoxSchema, dict]) -> SvgParams:
+    from .schema_handler import parse_schema_dict, parse_schema_to_svg_params
+
+    if isinstance(schema, dict):
+        schema = parse_schema_dict(schema)
+    return parse_schema_to_svg_params(schema)
+
+
+async def convert_inkscape(content_svg: str, extension: str, dpi: int = 300) -> bytes:
+    """Same as save_to.execute_local_pipe, awaiting inkscape instead of blocking."""
+    from .save_to import inkscape_pipe_command
+
+    process = await asyncio.create_subprocess_exec(
+        *inkscape_pipe_command(extension, dpi),
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(content_svg.encode())
+    if process.returncode != 0:
+        raise RuntimeError(f"Error running inkscape locally: {stderr}")
+    return stdout
+
+
+# semaphores belong to a loop, so each running loop gets its own default renderer
+_renderers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncRenderer]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_renderer() -> AsyncRenderer:
+    """Returns the default renderer of the running loop."""
+    loop = asyncio.get_running_loop()
+    renderer = _renderers.get(loop)
+    if renderer is None:
+        renderer = _renderers[loop] = AsyncRenderer()
+    return renderer
+
+
+async def render(
+    schema: Union[SvgParams, IdBoxSchema, dict],
+    format: str = "svg",
+    dpi: int = 300,
+    **kwargs,
+) -> bytes:
+    """Renders a box with the default renderer of the running loop, see AsyncRenderer."""
+    return await get_renderer().render(schema, format, dpi, **kwargs)
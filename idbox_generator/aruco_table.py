@@ -0,0 +1,73 @@
+import functools
+from pathlib import Path
+
+from .types import TileGrid
+
+_CURRENT_DIR = Path(__file__).parent.absolute()
+_DATA_DIR = _CURRENT_DIR / "data"
+
+# Every DICT_APRILTAG_36h11 marker, so that rendering never needs OpenCV.
+# Each marker is MARKER_SIZE rows of MARKER_SIZE bits (border included), row-major
+# and most significant bit first, where a set bit is a white tile.
+# OpenCV is only needed to regenerate or verify it:
+#   python -m idbox_generator.aruco_table [--verify]
+FILENAME_TABLE = _DATA_DIR / "apriltag_36h11.bin"
+NUM_MARKERS = 587
+MARKER_SIZE = 8  # 6x6 bits and a 1 tile black border
+BYTES_PER_MARKER = MARKER_SIZE * MARKER_SIZE // 8
+
+
+@functools.lru_cache(maxsize=None)
+def load_table() -> bytes:
+    with open(FILENAME_TABLE, "rb") as f:
+        table = f.read()
+    if len(table) != NUM_MARKERS * BYTES_PER_MARKER:
+        raise ValueError(f"{FILENAME_TABLE.name} is corrupted, regenerate it")
+    return table
+
+
+@functools.lru_cache(maxsize=NUM_MARKERS)
+def lookup(id: int) -> TileGrid:
+    if id < 0 or id >= NUM_MARKERS:
+        raise ValueError(f"aruco id should be between 0 and {NUM_MARKERS - 1}")
+    offset = id * BYTES_PER_MARKER
+    packed = load_table()[offset : offset + BYTES_PER_MARKER]
+    return TileGrid(MARKER_SIZE, MARKER_SIZE, packed)
+
+
+def build_table() -> bytes:
+    import cv2.aruco as aruco
+    import numpy as np
+
+    aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_APRILTAG_36h11)
+    return b"".join(
+        np.packbits(
+            aruco.generateImageMarker(aruco_dict, id, MARKER_SIZE) == 255
+        ).tobytes()
+        for id in range(NUM_MARKERS)
+    )
+
+
+def verify_table() -> bool:
+    return load_table() == build_table()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description=f"Regenerates {FILENAME_TABLE.name} with OpenCV."
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Only check that the shipped table matches OpenCV",
+    )
+    args = parser.parse_args()
+    if args.verify:
+        assert verify_table(), f"{FILENAME_TABLE.name} does not match OpenCV"
+        print(f"Verified {FILENAME_TABLE}")
+    else:
+        with open(FILENAME_TABLE, "wb") as f:
+            f.write(build_table())
+        print(f"Generated {FILENAME_TABLE}")
@@ -0,0 +1,382 @@
+import functools
+import logging
+import shutil
+import threading
+import time
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Iterator, Optional
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# picks the cheapest available backend for the job, see select_backend
+AUTO = "auto"
+# draws png straight from SvgParams without an SVG, see raster.py
+RASTER_BACKEND = "raster"
+# seconds to wait for the docker daemon when checking whether docker is available
+DOCKER_PING_TIMEOUT = 2
+
+
+@dataclass(frozen=True)
+class Backend:
+    """A way to convert SVG content to other formats.
+
+    `formats` are the extensions it converts to, and `dpi_formats` those whose
+    raster size follows the requested dpi. Costs are rough hints in seconds,
+    only meant to order backends in select_backend rather than measured (see
+    benchmark.py), `startup_cost` being paid once per process and
+    `per_file_cost` for every file.
+    `rasterize` returns a PIL image at a dpi, by default decoding its png, and
+    `convert_pages` converts several SVGs to the pages of one PDF, if supported.
+    """
+
+    name: str
+    formats: frozenset[str]
+    dpi_formats: frozenset[str]
+    startup_cost: float
+    per_file_cost: float
+    convert: Callable[[str, str, int], bytes]
+    is_available: Callable[[], bool]
+    rasterize: Optional[Callable[[str, int], "Image.Image"]] = None
+    convert_pages: Optional[Callable[[list[str]], bytes]] = None
+
+    def cost(self, num_files: int = 1) -> float:
+        return self.startup_cost + num_files * self.per_file_cost
+
+
+_lock = threading.Lock()
+_registry: dict[str, Backend] = {}
+_stats: dict[str, dict[str, float]] = {}
+
+
+def register_backend(backend: Backend):
+    with _lock:
+        _registry[backend.name] = backend
+
+
+def get_backend(name: str) -> Backend:
+    backend = _registry.get(name)
+    if backend is None:
+        raise ValueError(f"Unknown backend {name}, use one of {backend_names()}")
+    return backend
+
+
+def backend_names() -> tuple[str, ...]:
+    return tuple(_registry)
+
+
+def available_backends(
+    extension: str, num_files: int = 1, need_dpi: bool = False
+) -> list[Backend]:
+    """Returns the available backends converting to extension, cheapest first."""
+    return list(_iter_available(extension, num_files, need_dpi))
+
+
+def _iter_available(
+    extension: str, num_files: int = 1, need_dpi: bool = False
+) -> Iterator[Backend]:
+    # checks availability cheapest first, so docker is only pinged when it would be used
+    backends = sorted(
+        (
+            backend
+            for backend in _registry.values()
+            if extension in backend.formats
+            and (not need_dpi or extension in backend.dpi_formats)
+        ),
+        key=lambda backend: backend.cost(num_files),
+    )
+    return (backend for backend in backends if backend.is_available())
+
+
+def select_backend(
+    extension: str, num_files: int = 1, need_dpi: bool = False
+) -> Backend:
+    """Returns the fastest available backend to convert num_files to extension."""
+    backend = next(_iter_available(extension, num_files, need_dpi), None)
+    if backend is None:
+        raise RuntimeError(f"No available backend converts to {extension}")
+    logger.info(
+        "Selected %s backend for %d %s file(s)", backend.name, num_files, extension
+    )
+    return backend
+
+
+def convert(
+    content_svg: str,
+    extension: str,
+    dpi: int = 300,
+    backend: str = AUTO,
+    fallback: bool = True,
+) -> bytes:
+    """Converts with the named backend, falling back to the next cheapest on failure."""
+    chosen = select_backend(extension) if backend == AUTO else get_backend(backend)
+    tried = set()
+    while True:
+        tried.add(chosen.name)
+        start = time.perf_counter()
+        try:
+            content = chosen.convert(content_svg, extension, dpi)
+        except Exception as e:
+            _record(chosen.name, time.perf_counter() - start, failed=True)
+            # only look for fallbacks on failure, checking for docker is slow
+            next_backend = next(
+                (
+                    other
+                    for other in (_iter_available(extension) if fallback else ())
+                    if other.name not in tried
+                ),
+                None,
+            )
+            if next_backend is None:
+                raise
+            logger.warning(
+                "%s backend failed (%s), falling back to %s",
+                chosen.name,
+                e,
+                next_backend.name,
+            )
+            chosen = next_backend
+            continue
+        _record(chosen.name, time.perf_counter() - start)
+        logger.debug("Generated %s using %s", extension, chosen.name)
+        return content
+
+
+def rasterize(content_svg: str, dpi: int = 300, backend: str = AUTO) -> "Image.Image":
+    """Rasterizes to a PIL image whose size follows dpi, to derive several outputs from."""
+    if backend == AUTO:
+        chosen = next(
+            (
+                candidate
+                for candidate in _iter_available("png")
+                if candidate.rasterize is not None or "png" in candidate.dpi_formats
+            ),
+            None,
+        )
+        if chosen is None:
+            raise RuntimeError("No available backend rasterizes at a given dpi")
+        backend = chosen.name
+    else:
+        chosen = get_backend(backend)
+    if chosen.rasterize is None:
+        from io import BytesIO
+
+        from PIL import Image
+
+        content = convert(content_svg, "png", dpi=dpi, backend=backend)
+        return Image.open(BytesIO(content))
+
+    start = time.perf_counter()
+    img = chosen.rasterize(content_svg, dpi)
+    _record(chosen.name, time.perf_counter() - start)
+    return img
+
+
+def convert_pages(contents_svg: list[str], backend: str = AUTO) -> bytes:
+    """Converts SVGs to the pages of one PDF, in a single backend call."""
+    if backend == AUTO:
+        chosen = next(
+            (
+                candidate
+                for candidate in _iter_available("pdf")
+                if candidate.convert_pages is not None
+            ),
+            None,
+        )
+        if chosen is None:
+            raise RuntimeError("No available backend converts to multi-page PDF")
+    else:
+        chosen = get_backend(backend)
+        if chosen.convert_pages is None:
+            raise ValueError(f"{backend} backend cannot convert to multi-page PDF")
+
+    start = time.perf_counter()
+    content = chosen.convert_pages(contents_svg)
+    _record(chosen.name, time.perf_counter() - start)
+    logger.debug("Generated %d pdf pages using %s", len(contents_svg), chosen.name)
+    return content
+
+
+def _record(name: str, seconds: float, failed: bool = False):
+    with _lock:
+        stats = _stats.setdefault(name, {"files": 0, "failures": 0, "seconds": 0.0})
+        stats["failures" if failed else "files"] += 1
+        stats["seconds"] += seconds
+
+
+def backend_stats() -> dict[str, dict[str, float]]:
+    """Returns, per backend used in this process, its converted files, failures and seconds."""
+    with _lock:
+        return {name: dict(stats) for name, stats in _stats.items()}
+
+
+def reset_backend_stats():
+    with _lock:
+        _stats.clear()
+
+
+def _png_to_jpg(content_png: bytes) -> bytes:
+    from io import BytesIO
+
+    from PIL import Image
+
+    jpg_buffer = BytesIO()
+    with Image.open(BytesIO(content_png)) as img:
+        if img.mode in ("RGBA", "LA"):
+            bg = Image.new("RGB", img.size, (255, 255, 255))
+            bg.paste(img, img)
+            img = bg
+        img.save(jpg_buffer, "JPEG")
+    return jpg_buffer.getvalue()
+
+
+def _via_png(convert_inkscape: Callable[[str, str, int], bytes]):
+    # inkscape has no jpg export, so jpg is encoded from its png
+    def convert(content_svg: str, extension: str, dpi: int) -> bytes:
+        if extension == "jpg":
+            return _png_to_jpg(convert_inkscape(content_svg, "png", dpi))
+        return convert_inkscape(content_svg, extension, dpi)
+
+    return convert
+
+
+def _convert_cairo(content_svg: str, extension: str, dpi: int) -> bytes:
+    from .converter import convert_svg_to_jpg, convert_svg_to_pdf, convert_svg_to_png
+
+    if extension == "png":
+        return convert_svg_to_png(content_svg, dpi=dpi)
+    if extension == "pdf":
+        return convert_svg_to_pdf(content_svg)
+    return convert_svg_to_jpg(content_svg, dpi=dpi)
+
+
+def _rasterize_cairo(content_svg: str, dpi: int) -> "Image.Image":
+    from .converter import rasterize_svg
+
+    return rasterize_svg(content_svg, dpi=dpi)
+
+
+def _convert_pages_cairo(contents_svg: list[str]) -> bytes:
+    from .converter import convert_svgs_to_pdf
+
+    return convert_svgs_to_pdf(contents_svg)
+
+
+def _convert_inkscape(content_svg: str, extension: str, dpi: int) -> bytes:
+    from .save_to import execute_local_pipe
+
+    return execute_local_pipe(content_svg, extension, dpi=dpi)
+
+
+def _convert_inkscape_pool(content_svg: str, extension: str, dpi: int) -> bytes:
+    from .inkscape_pool import get_pool
+
+    return get_pool().convert(content_svg, extension, dpi=dpi)
+
+
+def _convert_docker(content_svg: str, extension: str, dpi: int) -> bytes:
+    from .docker_converter import get_docker_converter
+
+    # reuses one long-lived container, see docker_converter.DockerConverter
+    return get_docker_converter().convert(content_svg, extension, dpi=dpi)
+
+
+@functools.lru_cache(maxsize=None)
+def _has_cairo() -> bool:
+    try:
+        import cairosvg  # noqa: F401
+    except (ImportError, OSError):  # OSError when libcairo is missing
+        return False
+    return True
+
+
+@functools.lru_cache(maxsize=None)
+def _has_inkscape() -> bool:
+    from .inkscape_pool import INKSCAPE_EXECUTABLE
+
+    return shutil.which(INKSCAPE_EXECUTABLE) is not None
+
+
+@functools.lru_cache(maxsize=None)
+def _has_docker() -> bool:
+    # a short-lived client, so an unresponsive daemon only blocks for the ping timeout
+    try:
+        import docker
+
+        client = docker.from_env(timeout=DOCKER_PING_TIMEOUT)
+        try:
+            return client.ping()
+        finally:
+            client.close()
+    except Exception:
+        return False
+
+
+for _backend in (
+    Backend(
+        name="cairo",
+        formats=frozenset({"png", "pdf", "jpg"}),
+        dpi_formats=frozenset({"jpg"}),  # png keeps a fixed 2x scale
+        startup_cost=0.2,
+        per_file_cost=0.03,
+        convert=_convert_cairo,
+        is_available=_has_cairo,
+        rasterize=_rasterize_cairo,
+        convert_pages=_convert_pages_cairo,
+    ),
+    Backend(
+        name="inkscape",
+        formats=frozenset({"png", "pdf", "jpg"}),
+        dpi_formats=frozenset({"png", "jpg"}),
+        startup_cost=0.0,
+        per_file_cost=1.0,
+        convert=_via_png(_convert_inkscape),
+        is_available=_has_inkscape,
+    ),
+    Backend(
+        name="inkscape-pool",
+        formats=frozenset({"png", "pdf", "jpg"}),
+        dpi_formats=frozenset({"png", "jpg"}),
+        startup_cost=1.0,
+        per_file_cost=0.15,
+        convert=_via_png(_convert_inkscape_pool),
+        is_available=_has_inkscape,
+    ),
+    Backend(
+        name="docker",
+        formats=frozenset({"png", "pdf", "jpg"}),
+        dpi_formats=frozenset({"png", "jpg"}),
+        startup_cost=3.0,
+        per_file_cost=1.2,
+        convert=_via_png(_convert_docker),
+        is_available=_has_docker,
+    ),
+):
+    register_backend(_backend)
+
+
+def resolve_backend(
+    extension: str,
+    backend: Optional[str] = None,
+    use_local: bool = True,
+    use_pool: bool = False,
+    num_files: int = 1,
+) -> Optional[str]:
+    """Returns the backend name to convert with, None if no backend is involved (svg).
+
+    Without a backend, use_local/use_pool pick docker, pooled inkscape, or
+    cairo for png and local inkscape otherwise, as before the registry.
+    """
+    if not any(extension in backend.formats for backend in _registry.values()):
+        return None
+    if backend == AUTO:
+        return select_backend(extension, num_files).name
+    if backend is not None:
+        return get_backend(backend).name
+    if not use_local:
+        return "docker"
+    if use_pool:
+        return "inkscape-pool"
+    return "cairo" if extension == "png" else "inkscape"
@@ -0,0 +1,770 @@
+import argparse
+import csv
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Union
+
+from . import profiling
+from .backends import AUTO, RASTER_BACKEND, resolve_backend
+from .imposition import GAP_DEFAULT, MARGIN_DEFAULT, PAGE_SIZES, impose_to_pdf
+from .types import IdBoxSchema, SvgParams
+
+ROW_DATA_MATRIX_TEXT = "data_matrix_text"
+ROW_ARUCO_STUB_ID = "aruco_stub_id"
+ROW_DEFAULT_VALUES = "default_values"
+ROW_FILENAME = "filename"
+DEFAULT_VALUE_SEPARATOR = ";"
+CHUNKSIZE_DEFAULT = 16
+# boxes rendered ahead of the consumer of iter_batch, per worker process
+IN_FLIGHT_PER_PROCESS = 2
+# the only backend converting several SVGs to the pages of one PDF
+IMPOSE_BACKEND = "cairo"
+
+
+@dataclass
+class BatchResult:
+    filenames: list[str] = field(default_factory=lambda: [])
+    seconds: float = 0.0
+    backend: Optional[str] = None
+    cache_hits: int = 0
+    cache_misses: int = 0
+    # boxes generated, when several share a file as with impose_batch
+    num_boxes: Optional[int] = None
+
+    @property
+    def count(self) -> int:
+        return self.num_boxes if self.num_boxes is not None else len(self.filenames)
+
+    @property
+    def boxes_per_second(self) -> float:
+        return self.count / self.seconds if self.seconds > 0 else 0.0
+
+
+def read_rows(filename: Union[str, Path]) -> list[dict]:
+    """Reads per-student rows from a .csv (with header) or .jsonl file."""
+    return list(iter_rows(filename))
+
+
+def iter_rows(filename: Union[str, Path]) -> Iterator[dict]:
+    """Same as read_rows, reading one row at a time."""
+    filename = Path(filename)
+    with open(filename, newline="") as f:
+        if filename.suffix == ".jsonl":
+            yield from (json.loads(line) for line in f if line.strip())
+        else:
+            yield from csv.DictReader(f)
+
+
+def _row_value(row: dict, key: str):
+    # empty CSV cells are the same as a missing column
+    value = row.get(key)
+    return None if value is None or value == "" else value
+
+
+def _row_filename(row: dict, default: str) -> str:
+    return _row_value(row, ROW_FILENAME) or default
+
+
+def _parse_row(row: dict) -> tuple[Optional[str], Optional[int], Optional[list[str]]]:
+    data_matrix_text = _row_value(row, ROW_DATA_MATRIX_TEXT)
+    aruco_stub_id = _row_value(row, ROW_ARUCO_STUB_ID)
+    if aruco_stub_id is not None:
+        aruco_stub_id = int(aruco_stub_id)
+    default_values = _row_value(row, ROW_DEFAULT_VALUES)
+    if isinstance(default_values, str):
+        default_values = default_values.split(DEFAULT_VALUE_SEPARATOR)
+    return data_matrix_text, aruco_stub_id, default_values
+
+
+# parsed once per worker process by _init_worker
+_base = {}
+
+
+def _init_worker(
+    base_params,
+    extension,
+    use_local,
+    use_pool,
+    stamp=False,
+    backend=None,
+    cache_dir=None,
+    base_key=None,
+    profile=None,
+):
+    from .stamp import SvgStamp
+
+    if profile is not None:
+        if multiprocessing.parent_process() is not None:
+            # forked workers inherit what the parent recorded, which it already has
+            profiling.reset()
+        profiling.enable(trace=profile)
+
+    _base["params"] = base_params
+    _base["stamp"] = None
+    if stamp and isinstance(base_params, SvgParams):
+        if backend == RASTER_BACKEND:
+            from .raster import RasterStamp
+
+            _base["stamp"] = RasterStamp(base_params)
+        else:
+            _base["stamp"] = SvgStamp(base_params)
+    _base["extension"] = extension
+    _base["use_local"] = use_local
+    _base["use_pool"] = use_pool
+    _base["backend"] = backend
+    _base["cache"] = None
+    if cache_dir is not None:
+        from .output_cache import OutputCache
+
+        _base["cache"] = OutputCache(cache_dir)
+    _base["base_key"] = base_key
+
+
+def _params_one(row: dict) -> Union[SvgParams, dict]:
+    from .schema_handler import vary_svg_params
+
+    data_matrix_text, aruco_stub_id, default_values = _parse_row(row)
+    base_params = _base["params"]
+    if isinstance(base_params, SvgParams):
+        return vary_svg_params(
+            base_params,
+            data_matrix_text=data_matrix_text,
+            aruco_stub_id=aruco_stub_id,
+            default_values=default_values,
+        )
+    # the template only draws the markers of a schema, a template file has none
+    if data_matrix_text is not None or aruco_stub_id is not None or default_values:
+        raise ValueError(
+            f"{ROW_DATA_MATRIX_TEXT}, {ROW_ARUCO_STUB_ID} and {ROW_DEFAULT_VALUES} require an IdBoxSchema"
+        )
+    return base_params
+
+
+def _render_one(row: dict) -> str:
+    from .generate import create_svg, create_svg_from_params
+
+    params = _params_one(row)
+    if not isinstance(params, SvgParams):
+        return create_svg(params)
+    if _base["stamp"] is not None:
+        return _base["stamp"].render(params)
+    return create_svg_from_params(params)
+
+
+def _generate_one(job: tuple[str, dict]) -> tuple[str, Optional[bool], Optional[dict]]:
+    """Returns the generated filename, whether it came from the cache if any,
+    and what was profiled meanwhile, see profiling.drain.
+    """
+    filename_output, cached = _generate_cached(job)
+    return filename_output, cached, profiling.drain()
+
+
+def _generate_cached(job: tuple[str, dict]) -> tuple[str, Optional[bool]]:
+    cache = _base["cache"]
+    if cache is None:
+        return _generate_uncached(job), None
+
+    from .output_cache import cache_key
+
+    filename_output, row = job
+    extension = _base["extension"]
+    inputs = [_base["base_key"], {k: v for k, v in row.items() if k != ROW_FILENAME}]
+    key = cache_key(inputs, extension, backend=_base["backend"])
+    if cache.copy_to(key, extension, filename_output):
+        return filename_output, True
+    _generate_uncached(job)
+    cache.put_file(key, extension, filename_output)
+    return filename_output, False
+
+
+def _raster_one(row: dict) -> bytes:
+    from .raster import convert_params_to_png, encode_png
+
+    params = _params_one(row)
+    if _base["extension"] != "png" or not isinstance(params, SvgParams):
+        raise ValueError(f"{RASTER_BACKEND} backend only draws png from a schema")
+    if _base["stamp"] is not None:
+        return encode_png(_base["stamp"].render(params))
+    return convert_params_to_png(params)
+
+
+def _content_one(row: dict) -> tuple[bytes, Optional[dict]]:
+    """Returns the bytes of the file of a row, and what was profiled meanwhile."""
+    from .save_to import svg_to_bytes
+
+    extension = _base["extension"]
+    if _base["backend"] == RASTER_BACKEND:
+        content = _raster_one(row)
+    elif extension == "svg" and _base["stamp"] is None:
+        from .generate import stream_svg_from_params
+
+        params = _params_one(row)
+        if isinstance(params, SvgParams):
+            # encoded chunk by chunk, without the whole SVG as a str alongside
+            content = b"".join(
+                chunk.encode() for chunk in stream_svg_from_params(params)
+            )
+        else:
+            content = _render_one(row).encode()
+    elif extension == "png_local":
+        from .converter import convert_svg_to_png
+
+        content = convert_svg_to_png(_render_one(row))
+    else:
+        content = svg_to_bytes(
+            _render_one(row),
+            extension,
+            use_local=_base["use_local"],
+            use_pool=_base["use_pool"],
+            backend=_base["backend"],
+        )
+    return content, profiling.drain()
+
+
+def _generate_uncached(job: tuple[str, dict]) -> str:
+    from .generate import save_svg_to_file
+
+    filename_output, row = job
+    if _base["backend"] == RASTER_BACKEND:
+        from .save_to import write_bytes
+
+        write_bytes(filename_output, _raster_one(row))
+        return filename_output
+
+    content_svg = _render_one(row)
+    save_svg_to_file(
+        content_svg,
+        filename_output,
+        extension=_base["extension"],
+        use_local=_base["use_local"],
+        use_pool=_base["use_pool"],
+        backend=_base["backend"],
+    )
+    return filename_output
+
+
+def _parse_base(configuration: Union[IdBoxSchema, dict]):
+    from .generate import parse_configuration
+    from .schema_handler import parse_schema_dict, vary_svg_params
+
+    params = parse_configuration(configuration)
+    if isinstance(params, SvgParams):
+        schema = (
+            configuration
+            if isinstance(configuration, IdBoxSchema)
+            else parse_schema_dict(configuration)
+        )
+        # a batch pre-shades the defaultValue of each field, unless a row sets its own
+        default_values = [field_def.defaultValue for field_def in schema.fields]
+        if any(default_values):
+            params = vary_svg_params(params, default_values=default_values)
+    return params
+
+
+def generate_batch(
+    configuration: Union[IdBoxSchema, dict],
+    rows: Iterable[dict],
+    output_dir: Union[str, Path] = ".",
+    extension: str = "svg",
+    filestem: str = "idbox",
+    processes: Optional[int] = 1,
+    use_local: bool = True,
+    use_pool: bool = False,
+    stamp: bool = False,
+    backend: Optional[str] = None,
+    cache_dir: Optional[Union[str, Path]] = None,
+    cache_max_bytes: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+    num_rows: Optional[int] = None,
+) -> BatchResult:
+    """Generates one box per row, parsing the configuration only once.
+
+    `configuration` is an IdBoxSchema, or the JSON data of either a schema
+    (with "fields") or a template file. Each row may set data_matrix_text,
+    aruco_stub_id, default_values (one per field, schemas only) and filename,
+    empty values being ignored. `processes`
+    sets the size of the process pool, None uses every core. `use_pool` keeps
+    long-lived inkscape workers in each process for png/pdf/jpg conversion.
+    `stamp` renders the static layer of a schema once per process, see stamp.py.
+    `backend` names a conversion backend or "auto" to pick the fastest for the
+    batch size, see backends.py. "raster" draws png straight from a schema,
+    see raster.py. With `cache_dir`, files whose inputs are unchanged are
+    copied from an OutputCache instead of generated, see output_cache.py.
+    With `max_in_flight`, rows are streamed through iter_batch and written
+    by this process, holding at most that many boxes at once.
+    """
+    start = time.perf_counter()
+    output_dir = Path(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    if max_in_flight is not None:
+        if cache_dir is not None:
+            raise ValueError("max_in_flight does not support cache_dir")
+        from .save_to import write_bytes
+
+        outputs = iter_batch(
+            configuration,
+            rows,
+            extension,
+            filestem,
+            processes,
+            max_in_flight,
+            num_rows,
+            use_local,
+            use_pool,
+            stamp,
+            backend,
+        )
+        filenames = []
+        for filename, content in outputs:
+            filename_output = str(output_dir / filename)
+            write_bytes(filename_output, content)
+            filenames.append(filename_output)
+        return BatchResult(
+            filenames=filenames, seconds=time.perf_counter() - start, backend=backend
+        )
+
+    rows = list(rows)
+
+    digits = len(str(max(len(rows) - 1, 0)))
+    jobs = [
+        (
+            str(
+                output_dir
+                / _row_filename(row, f"{filestem}_{i:0{digits}d}.{extension}")
+            ),
+            row,
+        )
+        for i, row in enumerate(rows)
+    ]
+
+    if backend != RASTER_BACKEND:
+        backend = resolve_backend(
+            extension,
+            backend,
+            use_local,
+            use_pool,
+            num_files=math.ceil(len(rows) / (processes or os.cpu_count() or 1)),
+        )
+    base_key = None
+    if cache_dir is not None:
+        from .output_cache import cache_key
+
+        # hashed once, rows are keyed on this digest and their own values
+        base_key = cache_key([configuration, stamp], extension, backend=backend)
+    initargs = (
+        _parse_base(configuration),
+        extension,
+        use_local,
+        use_pool,
+        stamp,
+        backend,
+        cache_dir,
+        base_key,
+        profiling.is_tracing() if profiling.is_enabled() else None,
+    )
+    with _docker_batch(backend == "docker"):
+        if processes == 1:
+            _init_worker(*initargs)
+            results = [_generate_one(job) for job in jobs]
+        else:
+            with ProcessPoolExecutor(
+                max_workers=processes, initializer=_init_worker, initargs=initargs
+            ) as executor:
+                results = list(
+                    executor.map(_generate_one, jobs, chunksize=CHUNKSIZE_DEFAULT)
+                )
+
+    for _, _, snapshot in results:
+        profiling.merge(snapshot)
+    if cache_dir is not None:
+        from .output_cache import MAX_BYTES_DEFAULT, OutputCache
+
+        OutputCache(cache_dir, cache_max_bytes or MAX_BYTES_DEFAULT).evict()
+
+    return BatchResult(
+        filenames=[filename for filename, _, _ in results],
+        seconds=time.perf_counter() - start,
+        backend=backend,
+        cache_hits=sum(cached is True for _, cached, _ in results),
+        cache_misses=sum(cached is False for _, cached, _ in results),
+    )
+
+
+@contextmanager
+def _docker_batch(uses_docker: bool):
+    if not uses_docker:
+        yield
+        return
+    # label the docker containers of every worker, to tear them down at the end
+    from .docker_converter import (
+        ENV_BATCH,
+        close_docker_converter,
+        stop_batch_containers,
+    )
+
+    batch = os.environ[ENV_BATCH] = uuid.uuid4().hex
+    try:
+        yield
+    finally:
+        close_docker_converter()
+        stop_batch_containers(batch)
+        del os.environ[ENV_BATCH]
+
+
+def iter_batch(
+    configuration: Union[IdBoxSchema, dict],
+    rows: Iterable[dict],
+    extension: str = "svg",
+    filestem: str = "idbox",
+    processes: Optional[int] = 1,
+    max_in_flight: Optional[int] = None,
+    num_rows: Optional[int] = None,
+    use_local: bool = True,
+    use_pool: bool = False,
+    stamp: bool = False,
+    backend: Optional[str] = None,
+) -> Iterator[tuple[str, bytes]]:
+    """Yields (filename, content) for each row in order, without holding the batch.
+
+    Same as generate_batch, except that files are handed to the caller instead
+    of written. Rows are read lazily, and at most `max_in_flight` boxes (by
+    default IN_FLIGHT_PER_PROCESS per process) are rendered or converted
+    ahead of the caller, so memory stays flat however many rows there are.
+    Filenames are numbered with as many digits as `num_rows` needs, if given,
+    which also sizes the batch for the "auto" backend.
+    """
+    processes = processes or os.cpu_count() or 1
+    if max_in_flight is None:
+        max_in_flight = IN_FLIGHT_PER_PROCESS * processes
+    if backend != RASTER_BACKEND:
+        backend = resolve_backend(
+            extension,
+            backend,
+            use_local,
+            use_pool,
+            num_files=math.ceil((num_rows or max_in_flight) / processes),
+        )
+    digits = len(str(max(num_rows - 1, 0))) if num_rows else 1
+    jobs = (
+        (_row_filename(row, f"{filestem}_{i:0{digits}d}.{extension}"), row)
+        for i, row in enumerate(rows)
+    )
+
+    initargs = (
+        _parse_base(configuration),
+        extension,
+        use_local,
+        use_pool,
+        stamp,
+        backend,
+        None,
+        None,
+        profiling.is_tracing() if profiling.is_enabled() else None,
+    )
+    with _docker_batch(backend == "docker"):
+        if processes == 1:
+            _init_worker(*initargs)
+            for filename, row in jobs:
+                content, snapshot = _content_one(row)
+                profiling.merge(snapshot)
+                yield filename, content
+            return
+
+        with ProcessPoolExecutor(
+            max_workers=processes, initializer=_init_worker, initargs=initargs
+        ) as executor:
+            # a row is only submitted once the caller took an earlier result
+            in_flight = deque()
+            for filename, row in jobs:
+                if len(in_flight) >= max_in_flight:
+                    yield _collect(*in_flight.popleft())
+                in_flight.append((filename, executor.submit(_content_one, row)))
+            while in_flight:
+                yield _collect(*in_flight.popleft())
+
+
+def _collect(filename: str, future) -> tuple[str, bytes]:
+    content, snapshot = future.result()
+    profiling.merge(snapshot)
+    return filename, content
+
+
+def impose_batch(
+    configuration: Union[IdBoxSchema, dict],
+    rows: Iterable[dict],
+    filename_output: Union[str, Path],
+    page: str = "A4",
+    margin: float = MARGIN_DEFAULT,
+    gap: float = GAP_DEFAULT,
+    landscape: bool = False,
+    per_page: Optional[int] = None,
+    stamp: bool = False,
+    backend: Optional[str] = AUTO,
+) -> BatchResult:
+    """Generates one box per row, imposed onto the pages of a single PDF.
+
+    Boxes are rendered in-process and every page is converted in one backend
+    call, see imposition.py. `per_page` limits the boxes on each page, e.g. to
+    1 for a box per student sheet. The result has the PDF as its only filename
+    and the number of boxes as its count. Raises ValueError without rows or
+    with a backend other than IMPOSE_BACKEND.
+    """
+    if backend in (None, AUTO):
+        backend = IMPOSE_BACKEND
+    if backend != IMPOSE_BACKEND:
+        raise ValueError(
+            f"{backend} backend cannot impose boxes onto pages, use {IMPOSE_BACKEND}"
+        )
+    start = time.perf_counter()
+    _init_worker(_parse_base(configuration), "pdf", True, False, stamp, backend)
+    contents_svg = [_render_one(row) for row in rows]
+    content = impose_to_pdf(
+        contents_svg, page, margin, gap, landscape, per_page, backend=backend
+    )
+    os.makedirs(Path(filename_output).parent, exist_ok=True)
+    with open(filename_output, "wb") as f:
+        f.write(content)
+    return BatchResult(
+        filenames=[str(filename_output)],
+        num_boxes=len(contents_svg),
+        seconds=time.perf_counter() - start,
+        backend=backend,
+    )
+
+
+def main(argv=None):
+    from .generate import load_configuration
+    from .backends import backend_names
+    from .layout import MANIFEST_FORMATS, save_manifest
+    from .output_cache import ENV_CACHE_DIR, MAX_BYTES_DEFAULT
+    from .save_to import SUPPORTED_EXTENSIONS
+
+    parser = argparse.ArgumentParser(
+        prog="generate batch",
+        description="Generates one id-box per row of a .csv/.jsonl file from a single configuration.",
+    )
+    parser.add_argument(
+        "configuration",
+        help='path/to/config.json or "{json: string}" or "command-line-pattern"',
+    )
+    parser.add_argument(
+        "rows",
+        help=f"path/to/rows.csv or rows.jsonl with {ROW_DATA_MATRIX_TEXT}/{ROW_ARUCO_STUB_ID}/{ROW_DEFAULT_VALUES}/{ROW_FILENAME} columns",
+    )
+    parser.add_argument(
+        "-f",
+        "--fills",
+        type=str,
+        default="",
+        help="Fill values to be used in command-line usage",
+    )
+    parser.add_argument(
+        "-e",
+        "--extension",
+        type=str,
+        default="svg",
+        choices=SUPPORTED_EXTENSIONS.keys(),
+        help="Output extension type",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=".",
+        help="Output directory",
+    )
+    parser.add_argument(
+        "-j",
+        "--processes",
+        type=int,
+        default=1,
+        help="Number of worker processes, 0 to use every core",
+    )
+    parser.add_argument(
+        "-d",
+        "--docker",
+        action="store_true",
+        help="Flag to use docker image for conversion",
+    )
+    parser.add_argument(
+        "-p",
+        "--inkscape-pool",
+        action="store_true",
+        help="Flag to convert with long-lived inkscape workers instead of one process per file",
+    )
+    parser.add_argument(
+        "-s",
+        "--stamp",
+        action="store_true",
+        help="Flag to render the static layer of a schema once and only stamp per-row parts",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        type=str,
+        default=None,
+        choices=(AUTO, *backend_names(), RASTER_BACKEND),
+        help="Conversion backend, auto picks the fastest available one for the batch size (defaults to cairo for png, inkscape otherwise), raster draws png from a schema without SVG",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=os.environ.get(ENV_CACHE_DIR),
+        help=f"Directory of previously generated files to copy unchanged boxes from (defaults to ${ENV_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=MAX_BYTES_DEFAULT / 2**20,
+        help="Size in MB the cache directory is trimmed to, least recently used first",
+    )
+
+    parser.add_argument(
+        "--max-in-flight",
+        type=int,
+        default=None,
+        help="Stream rows with at most this many boxes in memory at once, for very large batches",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        choices=MANIFEST_FORMATS,
+        help="Also save the bubble and marker layout shared by every box as <output>/<name>.layout.<json|npz>",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Output filename of per-stage timings, call counts and bytes, including worker processes",
+    )
+    parser.add_argument(
+        "--profile-format",
+        type=str,
+        default="json",
+        choices=profiling.FORMATS,
+        help="Per-stage totals as json, or every call as a chrome trace (chrome://tracing, Perfetto)",
+    )
+
+    parser.add_argument(
+        "--impose",
+        type=str.upper,
+        default=None,
+        choices=PAGE_SIZES.keys(),
+        help="Page size to impose every box onto, as a single multi-page <output>/<name>.pdf",
+    )
+    parser.add_argument(
+        "--margin",
+        type=float,
+        default=MARGIN_DEFAULT,
+        help="Page margin in mm, with --impose",
+    )
+    parser.add_argument(
+        "--gap",
+        type=float,
+        default=GAP_DEFAULT,
+        help="Gap between boxes in mm, with --impose",
+    )
+    parser.add_argument(
+        "--per-page",
+        type=int,
+        default=None,
+        help="Maximum number of boxes per page, with --impose",
+    )
+    parser.add_argument(
+        "--landscape",
+        action="store_true",
+        help="Flag to impose onto landscape pages, with --impose",
+    )
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.profile:
+        profiling.enable(trace=args.profile_format == "chrome")
+    template_data, filestem_output = load_configuration(args.configuration, args.fills)
+    if args.manifest:
+        params = _parse_base(template_data)
+        if not isinstance(params, SvgParams):
+            parser.error("argument --manifest: needs a schema configuration")
+        os.makedirs(args.output, exist_ok=True)
+        filename_manifest = save_manifest(
+            params, Path(args.output) / f"{filestem_output}.layout.{args.manifest}"
+        )
+        print(f"Saved layout manifest {filename_manifest}")
+    if args.impose:
+        if args.backend not in (None, AUTO, IMPOSE_BACKEND):
+            parser.error(
+                f"argument --impose: only the {IMPOSE_BACKEND} backend converts pages, not {args.backend}"
+            )
+        rows = read_rows(args.rows)
+        if not rows:
+            parser.error(f"argument rows: no rows to impose in {args.rows}")
+        filename_output = Path(args.output) / f"{filestem_output}.pdf"
+        result = impose_batch(
+            template_data,
+            rows,
+            filename_output,
+            page=args.impose,
+            margin=args.margin,
+            gap=args.gap,
+            landscape=args.landscape,
+            per_page=args.per_page,
+            stamp=args.stamp,
+            backend=IMPOSE_BACKEND,
+        )
+        print(
+            f"Generated {result.count} boxes in {filename_output} in {result.seconds:.2f}s ({result.boxes_per_second:.1f} boxes/s)"
+        )
+        _write_profile(args)
+        return
+    if args.max_in_flight is not None and args.cache_dir:
+        parser.error("argument --max-in-flight: not allowed with --cache-dir")
+    if args.max_in_flight is not None:
+        # counted in a first pass, to number filenames without holding the rows
+        rows = iter_rows(args.rows)
+        num_rows = sum(1 for _ in iter_rows(args.rows))
+    else:
+        rows = read_rows(args.rows)
+        num_rows = len(rows)
+    result = generate_batch(
+        template_data,
+        rows,
+        output_dir=args.output,
+        extension=args.extension,
+        filestem=filestem_output,
+        processes=args.processes or None,
+        use_local=not args.docker,
+        use_pool=args.inkscape_pool,
+        stamp=args.stamp,
+        backend=args.backend,
+        cache_dir=args.cache_dir,
+        cache_max_bytes=int(args.cache_size * 2**20),
+        max_in_flight=args.max_in_flight,
+        num_rows=num_rows,
+    )
+    print(
+        f"Generated {result.count} boxes in {result.seconds:.2f}s ({result.boxes_per_second:.1f} boxes/s)"
+        + (f" using {result.backend}" if result.backend else "")
+        + (
+            f", {result.cache_hits} cached and {result.cache_misses} generated"
+            if args.cache_dir
+            else ""
+        )
+    )
+    _write_profile(args)
+
+
+def _write_profile(args):
+    if args.profile:
+        profiling.write_profile(args.profile, args.profile_format)
+        print(f"Profiled in {args.profile}")
@@ -0,0 +1,313 @@
+import argparse
+import dataclasses
+import json
+import platform
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable, Optional
+
+from .types import IdBoxSchema, IdBoxSchemaCustomFieldDefs, IdBoxSchemaHeader
+
+_CURRENT_DIR = Path(__file__).parent.absolute()
+TEMPLATES_DIR = _CURRENT_DIR.parent / "templates"
+TEMPLATE_NAMES = ("nric", "nus", "birthdate")
+SYNTHETIC_COLUMNS = (50, 200, 500)
+REPEAT_DEFAULT = 5
+# a stage is slower when its median is this much above the earlier run...
+TOLERANCE_DEFAULT = 0.25
+# ...and by more than this many seconds, so that microsecond stages do not flap
+NOISE_FLOOR = 0.0005
+DATA_MATRIX_TEXT = "A01"
+ARUCO_STUB_ID = 7
+
+
+@dataclasses.dataclass
+class Case:
+    name: str
+    schema: IdBoxSchema
+    # JSON data of a template file, for the parse_json stage
+    template_data: Optional[dict] = None
+
+
+def template_to_schema(template_data: dict) -> IdBoxSchema:
+    """Builds the IdBoxSchema of a template file, one field per column of its columns pattern."""
+    from .generate import load_default_data
+
+    column_types = dict(load_default_data()["columnTypes"])
+    for column_type in template_data.get("columnTypes", []):
+        column_types[column_type["id"]] = column_type
+    header_names = {f.name for f in dataclasses.fields(IdBoxSchemaHeader)}
+    field_names = {f.name for f in dataclasses.fields(IdBoxSchemaCustomFieldDefs)}
+
+    fields = []
+    for group in template_data["columns"].split("|"):
+        for column_id in group.split(";"):
+            column_type = {**column_types["default"], **column_types[column_id]}
+            column_type["values"] = column_type["values"].replace("|", ";")
+            fields.append(
+                IdBoxSchemaCustomFieldDefs(
+                    **{k: v for k, v in column_type.items() if k in field_names}
+                )
+            )
+    header = {
+        **load_default_data()["header"],
+        **template_data.get("header", {}),
+    }
+    return IdBoxSchema(
+        header=IdBoxSchemaHeader(
+            **{k: v for k, v in header.items() if k in header_names}
+        ),
+        fields=fields,
+        fills=list(template_data.get("fills") or ["#ffffff", "#d8e0f2"]),
+        data_matrix_text=DATA_MATRIX_TEXT,
+        aruco_stub_id=ARUCO_STUB_ID,
+    )
+
+
+def synthetic_schema(num_columns: int) -> IdBoxSchema:
+    return IdBoxSchema(
+        header=IdBoxSchemaHeader(value=f"SYNTHETIC {num_columns}"),
+        fields=[
+            IdBoxSchemaCustomFieldDefs(values="0;1;2;3;4;5;6;7;8;9")
+            for _ in range(num_columns)
+        ],
+        data_matrix_text=DATA_MATRIX_TEXT,
+        aruco_stub_id=ARUCO_STUB_ID,
+    )
+
+
+def load_corpus(templates_dir=TEMPLATES_DIR) -> list[Case]:
+    """nric, nus and birthdate from templates_dir if present, and synthetic boxes."""
+    cases = []
+    for name in TEMPLATE_NAMES:
+        filename = Path(templates_dir) / f"{name}.json"
+        if not filename.is_file():
+            continue
+        with open(filename) as f:
+            template_data = json.load(f)
+        cases.append(Case(name, template_to_schema(template_data), template_data))
+    for num_columns in SYNTHETIC_COLUMNS:
+        cases.append(Case(f"columns_{num_columns}", synthetic_schema(num_columns)))
+    return cases
+
+
+def time_stage(func: Callable, repeat: int = REPEAT_DEFAULT) -> dict:
+    """Runs func once to warm up and `repeat` times timed, returns seconds per run."""
+    output = func()
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = func()
+        runs.append(time.perf_counter() - start)
+    result = {
+        "median": statistics.median(runs),
+        "min": min(runs),
+        "max": max(runs),
+        "runs": repeat,
+    }
+    if isinstance(output, (bytes, str)):
+        result["bytes"] = len(output)
+    return result
+
+
+def stages(case: Case) -> dict[str, Callable]:
+    """Returns every stage of a case by name, each callable without arguments.
+
+    Conversions only include formats with an available backend.
+    """
+    from . import aruco_table, backends, json_parser
+    from .datamatrix import id_to_aruco_tiles, str_to_datamatrix
+    from .generate import create_svg_from_params, generate_svg_params
+    from .save_to import SUPPORTED_FORMATS
+    from .schema_handler import parse_schema_to_svg_params
+
+    params = parse_schema_to_svg_params(case.schema)
+    content_svg = create_svg_from_params(params)
+
+    # bypass the lru_caches, which would otherwise time a dict lookup
+    result = {}
+    if case.template_data is not None:
+        result["parse_json"] = _uncached(
+            lambda: generate_svg_params(case.template_data),
+            json_parser.compile_columns,
+        )
+    result["parse_schema_to_svg_params"] = lambda: parse_schema_to_svg_params(
+        case.schema
+    )
+    result["str_to_datamatrix"] = lambda: str_to_datamatrix.__wrapped__(
+        DATA_MATRIX_TEXT
+    )
+    result["id_to_aruco_tiles"] = _uncached(
+        lambda: id_to_aruco_tiles(ARUCO_STUB_ID), aruco_table.lookup
+    )
+    result["render"] = lambda: create_svg_from_params(params)
+    for extension, converter in SUPPORTED_FORMATS.items():
+        if extension == "svg":
+            result["convert_svg"] = lambda converter=converter: converter(content_svg)
+        elif backends.available_backends(extension):
+            result[f"convert_{extension}"] = lambda converter=converter: converter(
+                content_svg, backend=backends.AUTO
+            )
+    try:
+        from .raster import convert_params_to_png
+    except ImportError:
+        pass
+    else:
+        result["raster_png"] = lambda: convert_params_to_png(params)
+    return result
+
+
+def _uncached(func: Callable, *cached_funcs) -> Callable:
+    # clears the caches of cached_funcs before every run of func
+    def run():
+        for cached_func in cached_funcs:
+            cached_func.cache_clear()
+        return func()
+
+    return run
+
+
+def run_benchmarks(
+    cases: list[Case],
+    repeat: int = REPEAT_DEFAULT,
+    stage_names: Optional[list[str]] = None,
+) -> dict:
+    """Times every stage of every case, see time_stage."""
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        package_version = version("idbox_generator")
+    except PackageNotFoundError:
+        package_version = None
+
+    results = {}
+    for case in cases:
+        results[case.name] = {}
+        for name, func in stages(case).items():
+            if stage_names and name not in stage_names:
+                continue
+            results[case.name][name] = time_stage(func, repeat)
+    return {
+        "meta": {
+            "version": package_version,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": repeat,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+    }
+
+
+def compare(
+    results: dict, baseline: dict, tolerance: float = TOLERANCE_DEFAULT
+) -> list[str]:
+    """Returns a message per stage whose median is slower than in an earlier run.
+
+    `baseline` is the results of an earlier run, on the same machine for
+    timings to be comparable. Stages missing from either side are ignored.
+    """
+    regressions = []
+    for case_name, case_stages in results["results"].items():
+        baseline_stages = baseline.get("results", {}).get(case_name, {})
+        for stage_name, timing in case_stages.items():
+            if stage_name not in baseline_stages:
+                continue
+            before = baseline_stages[stage_name]["median"]
+            after = timing["median"]
+            if after > before * (1 + tolerance) and after - before > NOISE_FLOOR:
+                regressions.append(
+                    f"{case_name}/{stage_name}: {after * 1000:.2f}ms vs {before * 1000:.2f}ms before (+{(after / before - 1) * 100:.0f}%)"
+                )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="benchmark",
+        description="Times parsing, marker encoding, rendering and conversion of each box of a corpus.",
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        type=str,
+        default=None,
+        help="Output JSON filename, printed to stdout if not specified",
+    )
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        type=str,
+        default=None,
+        help="Results JSON of an earlier run on this machine (-o), exits with 1 if any stage is slower",
+    )
+    parser.add_argument(
+        "-t",
+        "--tolerance",
+        type=float,
+        default=TOLERANCE_DEFAULT,
+        help="Allowed slowdown of a stage median against --baseline, as a fraction",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeat",
+        type=int,
+        default=REPEAT_DEFAULT,
+        help="Timed runs per stage, after one warm-up run",
+    )
+    parser.add_argument(
+        "-c",
+        "--case",
+        action="append",
+        default=None,
+        help="Only run this case (repeatable), e.g. nric or columns_500",
+    )
+    parser.add_argument(
+        "-s",
+        "--stage",
+        action="append",
+        default=None,
+        help="Only run this stage (repeatable), e.g. render or convert_pdf",
+    )
+    parser.add_argument(
+        "--templates",
+        type=str,
+        default=str(TEMPLATES_DIR),
+        help="Directory of the nric/nus/birthdate template files",
+    )
+
+    args = parser.parse_args(argv)
+    cases = load_corpus(args.templates)
+    if args.case:
+        cases = [case for case in cases if case.name in args.case]
+    results = run_benchmarks(cases, repeat=args.repeat, stage_names=args.stage)
+
+    content = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(content + "\n")
+    else:
+        print(content)
+
+    for case_name, case_stages in results["results"].items():
+        for stage_name, timing in case_stages.items():
+            print(
+                f"{case_name:>12} {stage_name:<28} {timing['median'] * 1000:9.3f}ms",
+                file=sys.stderr,
+            )
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"Slower {regression}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print(f"No stage slower than in {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,5 @@
 def convert_svg_to_png(content_svg, dpi=300, scale=2) -> bytes:
+    """Pass `scale=dpi / 96` for the pixel size inkscape exports at `dpi`, see rasterize_svg."""
     from cairosvg import svg2png
 
     return svg2png(
@@ -6,3 +7,92 @@ def convert_svg_to_png(content_svg, dpi=300, scale=2) -> bytes:
         dpi=dpi,
         scale=scale,
     )  # type: ignore
+
+
+def convert_svg_to_pdf(content_svg, dpi=96) -> bytes:
+    from cairosvg import svg2pdf
+
+    return svg2pdf(bytestring=content_svg, dpi=dpi)  # type: ignore
+
+
+def rasterize_svg(content_svg, dpi=300, scale=None, background_color=None):
+    """Rasterizes to a PIL image, RGB on background_color or RGBA if it is None.
+
+    `scale` defaults to dpi / 96, the same pixel size inkscape exports at `dpi`.
+    """
+    import sys
+    from io import BytesIO
+
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PNGSurface
+    from PIL import Image
+
+    if scale is None:
+        scale = dpi / 96
+    surface = PNGSurface(
+        Tree(bytestring=content_svg),
+        None,
+        dpi,
+        scale=scale,
+        background_color=background_color,
+    )
+    surface.cairo.flush()
+    if sys.byteorder != "little":  # no raw mode for big-endian premultiplied ARGB
+        png_buffer = BytesIO()
+        surface.cairo.write_to_png(png_buffer)
+        surface.finish()
+        img = Image.open(png_buffer)
+        return img.convert("RGB" if background_color else "RGBA")
+
+    # ARGB32 pixels, premultiplied and in native byte order
+    mode, raw_mode = ("RGB", "BGRX") if background_color else ("RGBA", "BGRa")
+    img = Image.frombuffer(
+        mode,
+        (surface.width, surface.height),
+        bytes(surface.cairo.get_data()),
+        "raw",
+        raw_mode,
+        surface.cairo.get_stride(),
+        1,
+    )
+    surface.finish()
+    return img
+
+
+def convert_svg_to_jpg(content_svg, dpi=300, scale=None, quality=95) -> bytes:
+    """Rasterizes once onto white and encodes as JPEG, without a PNG round-trip."""
+    from io import BytesIO
+
+    img = rasterize_svg(content_svg, dpi=dpi, scale=scale, background_color="white")
+    jpg_buffer = BytesIO()
+    img.save(jpg_buffer, "JPEG", quality=quality)
+    return jpg_buffer.getvalue()
+
+
+def convert_svgs_to_pdf(contents_svg, dpi=96) -> bytes:
+    """Converts each SVG to a page of one PDF, drawn on a single cairo surface."""
+    from io import BytesIO
+
+    import cairocffi
+    from cairosvg.parser import Tree
+    from cairosvg.surface import PDFSurface
+
+    output = BytesIO()
+    pdf = None
+
+    class PageSurface(PDFSurface):
+        def _create_surface(self, width, height):
+            nonlocal pdf
+            if pdf is None:
+                pdf = cairocffi.PDFSurface(output, width, height)
+            else:
+                pdf.set_size(width, height)
+            return pdf, width, height
+
+    for content_svg in contents_svg:
+        PageSurface(Tree(bytestring=content_svg), None, dpi)
+        pdf.show_page()
+    if pdf is None:
+        raise ValueError("No pages to convert")
+    pdf.finish()
+    return output.getvalue()
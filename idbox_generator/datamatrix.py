@@ -1,32 +1,72 @@
-from pylibdmtx.pylibdmtx import encode
+import functools
+
+from . import aruco_table
+from .profiling import profiled
+from .types import TileGrid
 
 # The below constants are only for 10x10 datamatrix
 DATAMATRIX_SIZE = 10
 ENCODING_SIZE_NAMES = f"{DATAMATRIX_SIZE}x{DATAMATRIX_SIZE}"
 EDGE_SIZE = 14
 PADDING_SIZE = 2
-BYTES_PER_PIXEL = 3
-BYTES_PER_SQUARE_EDGE = BYTES_PER_PIXEL * 5
-BYTES_PER_DATAMATRIX_EDGE = BYTES_PER_SQUARE_EDGE * 70
+# number of distinct texts kept by str_to_datamatrix, e.g. repeated section codes
+CACHE_SIZE = 4096
 
 
-def str_to_datamatrix(text: str) -> list[list[bool]]:
+# profiled under the cache, so that only actual encodes are timed
+@functools.lru_cache(maxsize=CACHE_SIZE)
+@profiled("datamatrix.encode")
+def str_to_datamatrix(text: str) -> TileGrid:
     if len(text) > 3:
         raise ValueError("Input text should be less than 3 chars")
+    # imported on first encode, so that importing this module stays cheap
+    import numpy as np
+    from pylibdmtx.pylibdmtx import encode
+
     encoded = encode(text.encode("ascii"), size=ENCODING_SIZE_NAMES)
-    tiles = [[False for _ in range(DATAMATRIX_SIZE)] for _ in range(DATAMATRIX_SIZE)]
-    for r in range(PADDING_SIZE, EDGE_SIZE - PADDING_SIZE):
-        for c in range(PADDING_SIZE, EDGE_SIZE - PADDING_SIZE):
-            iloc = r * BYTES_PER_DATAMATRIX_EDGE + c * BYTES_PER_SQUARE_EDGE
-            tiles[r - PADDING_SIZE][c - PADDING_SIZE] = encoded.pixels[iloc] == 255
-    return tiles
-
-
-def id_to_aruco_tiles(id: int) -> list[list[bool]]:
-    import cv2.aruco as aruco
-
-    if id < 0 or id > 586:
-        raise ValueError("aruco id should be between 0 and 586")
-    aruco_dict = aruco.getPredefinedDictionary(aruco.DICT_APRILTAG_36h11)
-    img = aruco.generateImageMarker(aruco_dict, id, 8)
-    return [[bool(tile == 255) for tile in row] for row in img]
+    pixels = np.frombuffer(encoded.pixels, dtype=np.uint8).reshape(
+        encoded.height, encoded.width, encoded.bpp // 8
+    )
+    # every tile is a square of pixels, sample the first channel of its top-left pixel
+    tile_size = encoded.width // EDGE_SIZE
+    start = PADDING_SIZE * tile_size
+    stop = (EDGE_SIZE - PADDING_SIZE) * tile_size
+    tiles = pixels[start:stop:tile_size, start:stop:tile_size, 0] == 255
+    return TileGrid(DATAMATRIX_SIZE, DATAMATRIX_SIZE, np.packbits(tiles).tobytes())
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+@profiled("datamatrix.path")
+def tiles_to_path_data(
+    tiles: TileGrid, left: float, top: float, width: float, height: float
+) -> str:
+    """Returns SVG path data drawing every black tile, one subpath per run in a row.
+
+    Only absolute moves and relative h/v lines are used, which inkscape <= 1.1
+    renders the same as the individual <rect> tiles.
+    """
+    if len(tiles) == 0:
+        return ""
+    tile_width = width / tiles.num_columns
+    tile_height = height / tiles.num_rows
+    subpaths = []
+    for r, row in enumerate(tiles):
+        y = top + r * tile_height
+        c = 0
+        while c < len(row):
+            if row[c]:
+                c += 1
+                continue
+            start = c
+            while c < len(row) and not row[c]:
+                c += 1
+            x = left + start * tile_width
+            run_width = (c - start) * tile_width
+            subpaths.append(f"M{x},{y}h{run_width}v{tile_height}h{-run_width}z")
+    return "".join(subpaths)
+
+
+@profiled("datamatrix.aruco")
+def id_to_aruco_tiles(id: int) -> TileGrid:
+    # precomputed from cv2.aruco, see aruco_table.py
+    return aruco_table.lookup(id)
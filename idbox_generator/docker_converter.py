@@ -0,0 +1,200 @@
+import itertools
+import os
+import shutil
+import subprocess
+import tempfile
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Callable, Optional, Union
+
+from .profiling import profiled
+
+IMAGE_NAME = "noto-inkscape"
+IMAGE_TAG = "1.3"
+IMAGE_IDENTIFIER = f"{IMAGE_NAME}:{IMAGE_TAG}"
+CONTAINER_WORK_DIR = "/work"
+LABEL_BATCH = "idbox.batch"
+# containers started by the shared converter are labelled with this batch id
+ENV_BATCH = "IDBOX_DOCKER_BATCH"
+
+_client = None
+
+
+def get_docker_client():
+    """Returns a docker client, connecting only once per process."""
+    global _client
+    if _client is None:
+        # Docker CLI (comes with Docker Desktop) will need to be installed: https://docs.docker.com/engine/install/
+        try:
+            import docker  # pip install docker
+        except ImportError as e:
+            raise ImportError(
+                "Docker conversion needs the docker extra: pip install 'idbox_generator[docker]'"
+            ) from e
+
+        _client = docker.from_env()
+    return _client
+
+
+class DockerConverter:
+    """Converts SVGs inside one long-lived inkscape container.
+
+    The container is started on first use with a host work directory mounted
+    at /work, and every conversion is an `exec` into it, so container creation
+    and teardown are paid once per batch instead of once per file.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        image: str = IMAGE_IDENTIFIER,
+        labels: Optional[dict[str, str]] = None,
+    ):
+        self.client = client
+        self.image = image
+        self.labels = labels or {}
+        # created by start() and removed by close()
+        self.work_dir: Optional[Path] = None
+        self.container = None
+        self._counter = itertools.count()
+
+    @profiled("docker.startup")
+    def start(self):
+        self.client = self.client or get_docker_client()
+        if self.work_dir is None:
+            self.work_dir = Path(tempfile.mkdtemp(prefix="idbox-docker-"))
+        self.container = self.client.containers.run(
+            self.image,
+            command=["tail", "-f", "/dev/null"],
+            detach=True,
+            remove=True,
+            labels=self.labels,
+            volumes={str(self.work_dir): {"bind": CONTAINER_WORK_DIR, "mode": "rw"}},
+        )
+
+    def convert(
+        self, content_svg: Union[str, bytes], extension: str, dpi: int = 300
+    ) -> bytes:
+        if self.container is None:
+            self.start()
+        if isinstance(content_svg, str):
+            content_svg = content_svg.encode()
+        n = next(self._counter)
+        name_input = f"input-{n}.svg"
+        name_output = f"output-{n}.{extension}"
+        (self.work_dir / name_input).write_bytes(content_svg)
+        try:
+            exit_code, output = self.container.exec_run(
+                [
+                    "inkscape",
+                    f"--export-dpi={dpi}",
+                    f"--export-type={extension}",
+                    f"--export-filename={CONTAINER_WORK_DIR}/{name_output}",
+                    f"{CONTAINER_WORK_DIR}/{name_input}",
+                ]
+            )
+            assert exit_code == 0, f"Error running inkscape in docker: {output}"
+            return (self.work_dir / name_output).read_bytes()
+        finally:
+            (self.work_dir / name_input).unlink(missing_ok=True)
+            (self.work_dir / name_output).unlink(missing_ok=True)
+
+    def close(self):
+        if self.container is not None:
+            container, self.container = self.container, None
+            container.stop()
+        if self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_shared_converter: Optional[DockerConverter] = None
+
+
+def get_docker_converter() -> DockerConverter:
+    """Returns the process-wide converter, torn down at exit or by close_docker_converter."""
+    global _shared_converter
+    if _shared_converter is None:
+        batch = os.environ.get(ENV_BATCH)
+        _shared_converter = DockerConverter(
+            labels={LABEL_BATCH: batch} if batch else None
+        )
+        # unlike atexit, multiprocessing finalizers also run in ProcessPoolExecutor workers
+        Finalize(None, close_docker_converter, exitpriority=0)
+    return _shared_converter
+
+
+def close_docker_converter():
+    global _shared_converter
+    if _shared_converter is not None:
+        _shared_converter.close()
+        _shared_converter = None
+
+
+def stop_batch_containers(batch: str, client=None):
+    """Stops every container started for the batch, including by worker processes."""
+    client = client or get_docker_client()
+    for container in client.containers.list(
+        filters={"label": f"{LABEL_BATCH}={batch}"}
+    ):
+        container.stop()
+
+
+class FakeDockerClient:
+    """Stand-in for docker.DockerClient, running exec commands on the host.
+
+    Bind-mounted paths in commands are rewritten to their host directories.
+    `exec_handler(command) -> (exit_code, output)` replaces running the command,
+    e.g. when inkscape is not installed either. Every call is recorded in `calls`.
+    """
+
+    def __init__(
+        self, exec_handler: Optional[Callable[[list[str]], tuple[int, bytes]]] = None
+    ):
+        self.exec_handler = exec_handler
+        self.calls: list[tuple] = []
+        self.containers = self
+        self.started: list[_FakeContainer] = []
+
+    def run(self, image, command=None, volumes=None, labels=None, **kwargs):
+        self.calls.append(("run", image, command))
+        container = _FakeContainer(self, volumes or {}, labels or {})
+        self.started.append(container)
+        return container
+
+    def list(self, filters=None):
+        key, _, value = (filters or {}).get("label", "").partition("=")
+        return [
+            container
+            for container in self.started
+            if container.status == "running"
+            and (not key or container.labels.get(key) == value)
+        ]
+
+
+class _FakeContainer:
+    def __init__(self, client: FakeDockerClient, volumes: dict, labels: dict):
+        self.client = client
+        self.mounts = {volume["bind"]: host for host, volume in volumes.items()}
+        self.labels = labels
+        self.status = "running"
+
+    def exec_run(self, command: list[str]):
+        self.client.calls.append(("exec_run", command))
+        assert self.status == "running", "container is not running"
+        for bind, host in self.mounts.items():
+            command = [arg.replace(bind, host) for arg in command]
+        if self.client.exec_handler is not None:
+            return self.client.exec_handler(command)
+        output = subprocess.run(command, capture_output=True)
+        return output.returncode, output.stdout + output.stderr
+
+    def stop(self):
+        self.client.calls.append(("stop",))
+        self.status = "exited"
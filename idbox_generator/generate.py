@@ -1,24 +1,38 @@
 import argparse
 import dataclasses
+import functools
 import json
+import logging
 import os
 import re
+import sys
 from pathlib import Path
-from typing import Optional
-
-from jinja2 import Template
+from types import MappingProxyType
+from typing import BinaryIO, Iterator, Mapping, Optional
 
 from .types import SvgParams
 
 from .datamatrix import str_to_datamatrix
 from .json_parser import parse_json
-from .save_to import SUPPORTED_EXTENSIONS
+from .backends import AUTO, RASTER_BACKEND, backend_names, resolve_backend
+from . import profiling
+from .profiling import profiled
+from .output_cache import ENV_CACHE_DIR, MAX_BYTES_DEFAULT, OutputCache, cache_key
+from .save_to import (
+    FORMAT_DPI_SEPARATOR,
+    FORMAT_SEPARATOR,
+    SUPPORTED_EXTENSIONS,
+    parse_formats,
+    svg_to_bytes,
+    svg_to_formats,
+    write_bytes,
+)
+from .template_cache import get_template
 
 # pip install Jinja2
 
 
 _CURRENT_DIR = Path(__file__).parent.absolute()
-_ASSET_DIR = _CURRENT_DIR / "assets"
 _DATA_DIR = _CURRENT_DIR / "data"
 
 FILENAME_DEFAULT_JSON = _DATA_DIR / "default.json"
@@ -30,11 +44,30 @@ BUBBLE_RATIO = 0.8
 HEIGHT_TEXT_OFFSET = 1.5  # to ensure text is aligned vertically middle
 
 
-def generate_svg_params(template_data, data_matrix_text: Optional[str] = None):
+@functools.lru_cache(maxsize=None)
+def load_default_data() -> Mapping:
+    """Returns default.json, parsed once into a read-only registry.
+
+    Column types are indexed by id. parse_json layers each template's overrides
+    on fresh copies, so the registry is shared safely across calls and threads.
+    """
     with open(FILENAME_DEFAULT_JSON) as f:
         data = json.load(f)
+    data["columnTypes"] = {d["id"]: d for d in data.get("columnTypes", [])}
+    return _freeze(data)
+
+
+def _freeze(obj):
+    if isinstance(obj, dict):
+        return MappingProxyType({key: _freeze(value) for key, value in obj.items()})
+    if isinstance(obj, list):
+        return tuple(_freeze(value) for value in obj)
+    return obj
+
 
-    data = parse_json(data, template_data)
+@profiled("generate.parse")
+def generate_svg_params(template_data, data_matrix_text: Optional[str] = None):
+    data = parse_json(load_default_data(), template_data)
     columns = data["columns"]
 
     data["num_columns"] = len(columns)
@@ -56,34 +89,115 @@ def generate_svg_params(template_data, data_matrix_text: Optional[str] = None):
     data["height_bubble"] = HEIGHT_DEFAULT * BUBBLE_RATIO
     data["height_text_offset"] = HEIGHT_TEXT_OFFSET
 
+    set_data_matrix_params(data, data_matrix_text)
+    return data
+
+
+def set_data_matrix_params(data, data_matrix_text: Optional[str] = None):
     data["data_matrix"] = []
     if data_matrix_text is not None:
         data["data_matrix"] = str_to_datamatrix(data_matrix_text)
         data["data_matrix_offset_x"] = (HEIGHT_TITLE - HEIGHT_DEFAULT) / 2
         data["data_matrix_offset_y"] = (HEIGHT_TITLE - HEIGHT_DEFAULT) / 2
-    return data
-
 
-def create_svg_from_params(params: SvgParams):
-    svg_template_filepath = _ASSET_DIR / "template.svg"
-    with open(svg_template_filepath) as f:
-        svg_template = Template(f.read())
-
-    return svg_template.render(**dataclasses.asdict(params))
 
+# top-level fields only, the template reads nested params through their attributes
+_SVG_PARAMS_FIELDS = tuple(f.name for f in dataclasses.fields(SvgParams))
+
+
+# "path" merges the tiles of a marker into one <path>, "rect" draws one <rect> per tile
+MARKER_ENCODINGS = ("path", "rect")
+
+
+@profiled("generate.render")
+def create_svg_from_params(
+    params: SvgParams, template_name="template.svg", marker_encoding="path"
+):
+    svg_template = get_template(template_name)
+    context = {name: getattr(params, name) for name in _SVG_PARAMS_FIELDS}
+    context["marker_encoding"] = marker_encoding
+    return svg_template.render(context)
+
+
+def stream_svg_from_params(
+    params: SvgParams, template_name="template.svg", marker_encoding="path"
+) -> Iterator[str]:
+    """Same as create_svg_from_params, yielding the SVG in chunks as Jinja renders it."""
+    svg_template = get_template(template_name)
+    context = {name: getattr(params, name) for name in _SVG_PARAMS_FIELDS}
+    context["marker_encoding"] = marker_encoding
+    return svg_template.generate(context)
+
+
+@profiled("generate.render")
+def create_svg(params, template_name="template.svg", marker_encoding="path"):
+    svg_template = get_template(template_name)
+    return svg_template.render(**params, marker_encoding=marker_encoding)
+
+
+def render_to_bytes(
+    params: SvgParams,
+    format="svg",
+    dpi=300,
+    use_local=True,
+    use_pool=False,
+    backend=None,
+    cache: Optional[OutputCache] = None,
+) -> bytes:
+    """Renders params to the bytes of an svg/png/pdf/jpg file, without touching disk.
+
+    With the "raster" backend, png is drawn straight from params, see raster.py.
+    With a `cache`, unchanged params are read back instead of rendered.
+    """
+    if cache is not None:
+        if backend != RASTER_BACKEND:
+            backend = resolve_backend(format, backend, use_local, use_pool)
+        key = cache_key(params, format, dpi, backend)
+        content = cache.get(key, format)
+        if content is None:
+            content = render_to_bytes(params, format, dpi, use_local, use_pool, backend)
+            cache.put(key, format, content)
+        return content
+    if backend == RASTER_BACKEND and format == "png":
+        from .raster import convert_params_to_png
+
+        # a fixed 2x scale, as the default cairo png
+        return convert_params_to_png(params)
+    content_svg = create_svg_from_params(params)
+    return svg_to_bytes(
+        content_svg,
+        format,
+        dpi=dpi,
+        use_local=use_local,
+        use_pool=use_pool,
+        backend=backend,
+    )
 
-def create_svg(params):
-    svg_template_filepath = _ASSET_DIR / "template.svg"
-    with open(svg_template_filepath) as f:
-        svg_template = Template(f.read())
 
-    return svg_template.render(**params)
+def render_to_stream(
+    params: SvgParams, stream: BinaryIO, format="svg", dpi=300, **kwargs
+) -> int:
+    """Renders params into a binary file-like object, returns the number of bytes written."""
+    return stream.write(render_to_bytes(params, format, dpi=dpi, **kwargs))
 
 
-def save_svg_to_file(content_svg, filename_output, extension=None, use_local=True):
+def save_svg_to_file(
+    content_svg,
+    filename_output,
+    extension=None,
+    use_local=True,
+    use_pool=False,
+    backend=None,
+):
     extension = extension or Path(filename_output).suffix[1:]
     converter = SUPPORTED_EXTENSIONS[extension]
-    converter(filename_output, content_svg, use_local=use_local)
+    converter(
+        filename_output,
+        content_svg,
+        use_local=use_local,
+        use_pool=use_pool,
+        backend=backend,
+    )
 
 
 def slugify(text, separator="_"):
@@ -104,7 +218,96 @@ def is_json(text):
         return False
 
 
+def load_configuration(configuration, fills=""):
+    """Returns (template_data, filestem_output) for a CLI configuration argument."""
+    if os.path.exists(configuration):
+        filename_json = Path(configuration)
+        with open(filename_json) as f:
+            template_data = json.load(f)
+        filestem_output = filename_json.stem
+    elif is_json(configuration):
+        template_data = json.loads(configuration)
+        filestem_output = slugify(
+            template_data.get("header", {}).get("value", "output")
+        )
+    else:
+        header_value, columns = configuration.split("|", maxsplit=1)
+        template_data = {
+            "header": {
+                "value": header_value,
+            },
+            "columns": columns,
+        }
+        filestem_output = slugify(header_value)
+
+    fills = (
+        [hexcode or "none" for hexcode in fills.rstrip(";").split(";")] if fills else []
+    )
+    if fills:
+        template_data["fills"] = fills
+    return template_data, filestem_output
+
+
+def parse_configuration(configuration):
+    """Returns the SvgParams of an IdBoxSchema or of the JSON data of a schema
+    (with "fields"), or the params dict of a template file or command-line pattern.
+    """
+    from .schema_handler import parse_schema_dict, parse_schema_to_svg_params
+    from .types import IdBoxSchema
+
+    if isinstance(configuration, IdBoxSchema):
+        return parse_schema_to_svg_params(configuration)
+    if "fields" in configuration:
+        return parse_schema_to_svg_params(parse_schema_dict(configuration))
+    # template file or command-line pattern, parsed through default.json
+    return generate_svg_params(configuration)
+
+
+def create_svg_from_configuration(configuration) -> str:
+    params = parse_configuration(configuration)
+    if isinstance(params, SvgParams):
+        return create_svg_from_params(params)
+    return create_svg(params)
+
+
+def save_svg_to_files(
+    content_svg,
+    filestem_output,
+    formats,
+    dpi=300,
+    use_local=True,
+    use_pool=False,
+    backend=None,
+) -> list[str]:
+    """Saves one file per (extension, dpi) format from a single render, see svg_to_formats.
+
+    Formats with a dpi are saved as <filestem>_<dpi>dpi.<extension>.
+    """
+    outputs = svg_to_formats(
+        content_svg,
+        formats,
+        dpi=dpi,
+        use_local=use_local,
+        use_pool=use_pool,
+        backend=backend,
+    )
+    filenames_output = []
+    for (extension, format_dpi), content in outputs.items():
+        suffix = f"_{format_dpi}dpi" if format_dpi else ""
+        filename_output = f"{filestem_output}{suffix}.{extension}"
+        write_bytes(filename_output, content)
+        filenames_output.append(filename_output)
+    return filenames_output
+
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        from .batch import main as main_batch
+
+        return main_batch(sys.argv[2:])
+
+    from .layout import MANIFEST_FORMATS, save_manifest
+
     parser = argparse.ArgumentParser(
         description=f'Generates file format ({"/".join(SUPPORTED_EXTENSIONS.keys())}) from given id-box.json configuration.'
     )
@@ -124,8 +327,7 @@ def main():
         "--extension",
         type=str,
         default="svg",
-        choices=SUPPORTED_EXTENSIONS.keys(),
-        help="Output extension type",
+        help=f"Output extension type ({'/'.join(SUPPORTED_EXTENSIONS)}), or a list of formats with optional dpi such as svg,png@150,png@300,pdf",
     )
     parser.add_argument(
         "-o",
@@ -140,49 +342,156 @@ def main():
         action="store_true",
         help="Flag to use docker image for conversion",
     )
+    parser.add_argument(
+        "-p",
+        "--inkscape-pool",
+        action="store_true",
+        help="Flag to convert with long-lived inkscape workers instead of one process per file",
+    )
+    parser.add_argument(
+        "-b",
+        "--backend",
+        type=str,
+        default=None,
+        choices=(AUTO, *backend_names()),
+        help="Conversion backend, auto picks the fastest available one (defaults to cairo for png, inkscape otherwise)",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=str,
+        default=os.environ.get(ENV_CACHE_DIR),
+        help=f"Directory of previously generated files to copy unchanged outputs from (defaults to ${ENV_CACHE_DIR})",
+    )
+    parser.add_argument(
+        "--cache-size",
+        type=float,
+        default=MAX_BYTES_DEFAULT / 2**20,
+        help="Size in MB the cache directory is trimmed to, least recently used first",
+    )
+    parser.add_argument(
+        "--manifest",
+        type=str,
+        default=None,
+        choices=MANIFEST_FORMATS,
+        help="Also save the bubble and marker layout of the box as <output>.layout.<json|npz>",
+    )
+    parser.add_argument(
+        "--profile",
+        type=str,
+        default=None,
+        help="Output filename of per-stage timings, call counts and bytes",
+    )
+    parser.add_argument(
+        "--profile-format",
+        type=str,
+        default="json",
+        choices=profiling.FORMATS,
+        help="Per-stage totals as json, or every call as a chrome trace (chrome://tracing, Perfetto)",
+    )
 
     args = parser.parse_args()
-    args.fills = (
-        [hexcode or "none" for hexcode in args.fills.rstrip(";").split(";")]
-        if args.fills
-        else []
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.profile:
+        profiling.enable(trace=args.profile_format == "chrome")
+    template_data, filestem_output = load_configuration(args.configuration, args.fills)
+    if args.manifest:
+        params = parse_configuration(template_data)
+        if not isinstance(params, SvgParams):
+            parser.error("argument --manifest: needs a schema configuration")
+        filestem_manifest = (
+            str(Path(args.output).with_suffix("")) if args.output else filestem_output
+        )
+        filename_manifest = save_manifest(
+            params, f"{filestem_manifest}.layout.{args.manifest}"
+        )
+        print(f"Saved layout manifest {filename_manifest}")
+    cache = (
+        OutputCache(args.cache_dir, int(args.cache_size * 2**20))
+        if args.cache_dir
+        else None
     )
-    configuration = args.configuration
-    if os.path.exists(configuration):
-        filename_json = Path(configuration)
-        with open(filename_json) as f:
-            template_data = json.load(f)
-        filestem_output = filename_json.stem
-    elif is_json(configuration):
-        template_data = json.loads(configuration)
-        filestem_output = slugify(
-            template_data.get("header", {}).get("value", "output")
+
+    def key_of(extension, dpi=300, inputs=template_data):
+        backend = resolve_backend(
+            extension, args.backend, not args.docker, args.inkscape_pool
+        )
+        return cache_key(inputs, extension, dpi, backend)
+
+    if FORMAT_SEPARATOR in args.extension or FORMAT_DPI_SEPARATOR in args.extension:
+        try:
+            formats = parse_formats(args.extension)
+        except ValueError as e:
+            parser.error(f"argument -e/--extension: {e}")
+        if args.output:
+            filestem_output = str(Path(args.output).with_suffix(""))
+        filenames_output = [
+            f"{filestem_output}{f'_{dpi}dpi' if dpi else ''}.{extension}"
+            for extension, dpi in formats
+        ]
+        # resampled formats depend on the others, so the whole list is keyed
+        keys = (
+            [
+                key_of(extension, dpi or 300, [template_data, formats])
+                for extension, dpi in formats
+            ]
+            if cache
+            else []
+        )
+        if not cache or not all(
+            cache.copy_to(key, extension, filename_output)
+            for key, (extension, _), filename_output in zip(
+                keys, formats, filenames_output
+            )
+        ):
+            content_svg = create_svg_from_configuration(template_data)
+            filenames_output = save_svg_to_files(
+                content_svg,
+                filestem_output,
+                formats,
+                use_local=not args.docker,
+                use_pool=args.inkscape_pool,
+                backend=args.backend,
+            )
+            for key, (extension, _), filename_output in zip(
+                keys, formats, filenames_output
+            ):
+                cache.put_file(key, extension, filename_output)
+        for filename_output in filenames_output:
+            print(f"Generated {filename_output}")
+        if cache:
+            cache.evict()
+            print(cache.summary())
+        if args.profile:
+            profiling.write_profile(args.profile, args.profile_format)
+        return
+    if args.extension not in SUPPORTED_EXTENSIONS:
+        parser.error(
+            f"argument -e/--extension: invalid choice: '{args.extension}' (choose from {', '.join(SUPPORTED_EXTENSIONS)})"
         )
-    else:
-        header_value, columns = args.configuration.split("|", maxsplit=1)
-        template_data = {
-            "header": {
-                "value": header_value,
-            },
-            "columns": columns,
-        }
-        filestem_output = slugify(header_value)
-    if args.fills:
-        template_data["fills"] = args.fills
 
     filename_output = args.output or f"{filestem_output}.{args.extension}"
     if Path(filename_output).suffix[1:] in SUPPORTED_EXTENSIONS:
         args.extension = Path(filename_output).suffix[1:]
 
-    svg_params = generate_svg_params(template_data)
-    content_svg = create_svg(svg_params)
-    save_svg_to_file(
-        content_svg,
-        filename_output,
-        extension=args.extension,
-        use_local=not args.docker,
-    )
+    key = key_of(args.extension) if cache else None
+    if not cache or not cache.copy_to(key, args.extension, filename_output):
+        content_svg = create_svg_from_configuration(template_data)
+        save_svg_to_file(
+            content_svg,
+            filename_output,
+            extension=args.extension,
+            use_local=not args.docker,
+            use_pool=args.inkscape_pool,
+            backend=args.backend,
+        )
+        if cache:
+            cache.put_file(key, args.extension, filename_output)
     print(f"Generated {filename_output}")
+    if cache:
+        cache.evict()
+        print(cache.summary())
+    if args.profile:
+        profiling.write_profile(args.profile, args.profile_format)
 
 
 if __name__ == "__main__":
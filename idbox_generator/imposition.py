@@ -0,0 +1,150 @@
+import math
+import re
+from dataclasses import dataclass
+from typing import Iterable, Optional, Sequence, Union
+
+from .types import SvgParams
+
+# page sizes in millimetres, portrait
+PAGE_SIZES = {
+    "A3": (297, 420),
+    "A4": (210, 297),
+    "A5": (148, 210),
+    "LETTER": (215.9, 279.4),
+}
+# SVG user units are 96 dpi pixels
+PX_PER_MM = 96 / 25.4
+MARGIN_DEFAULT = 10  # mm
+GAP_DEFAULT = 5  # mm
+
+regex_svg_size = re.compile(r'<svg[^>]*?\swidth="([\d.]+)"[^>]*?\sheight="([\d.]+)"')
+
+
+@dataclass(frozen=True)
+class PageLayout:
+    """Grid of same-sized boxes on a page, all lengths in SVG pixels."""
+
+    page_width: float
+    page_height: float
+    box_width: float
+    box_height: float
+    margin: float
+    gap: float
+    per_page: Optional[int] = None
+
+    @property
+    def columns(self) -> int:
+        usable = self.page_width - 2 * self.margin + self.gap
+        return max(0, math.floor(usable / (self.box_width + self.gap)))
+
+    @property
+    def rows(self) -> int:
+        usable = self.page_height - 2 * self.margin + self.gap
+        return max(0, math.floor(usable / (self.box_height + self.gap)))
+
+    @property
+    def capacity(self) -> int:
+        capacity = self.columns * self.rows
+        return min(capacity, self.per_page) if self.per_page else capacity
+
+    def positions(self) -> list[tuple[float, float]]:
+        """Top-left corners of the boxes on a page, row by row."""
+        return [
+            (
+                self.margin + column * (self.box_width + self.gap),
+                self.margin + row * (self.box_height + self.gap),
+            )
+            for row in range(self.rows)
+            for column in range(self.columns)
+        ][: self.capacity]
+
+
+def page_layout(
+    box_width: float,
+    box_height: float,
+    page: str = "A4",
+    margin: float = MARGIN_DEFAULT,
+    gap: float = GAP_DEFAULT,
+    landscape: bool = False,
+    per_page: Optional[int] = None,
+) -> PageLayout:
+    """Lays out boxes (in pixels) on a named page, with margin and gap in mm."""
+    width, height = PAGE_SIZES[page.upper()]
+    if landscape:
+        width, height = height, width
+    layout = PageLayout(
+        page_width=width * PX_PER_MM,
+        page_height=height * PX_PER_MM,
+        box_width=box_width,
+        box_height=box_height,
+        margin=margin * PX_PER_MM,
+        gap=gap * PX_PER_MM,
+        per_page=per_page,
+    )
+    if layout.capacity == 0:
+        raise ValueError(
+            f"A {box_width:g}x{box_height:g}px box does not fit on {page} with {margin}mm margins"
+        )
+    return layout
+
+
+def svg_size(content_svg: str) -> tuple[float, float]:
+    """Returns the width and height of the root <svg> element."""
+    match = regex_svg_size.search(content_svg)
+    if not match:
+        raise ValueError("SVG has no width and height")
+    return float(match.group(1)), float(match.group(2))
+
+
+def impose(contents_svg: Sequence[str], layout: PageLayout) -> list[str]:
+    """Places boxes on as many pages as needed, returning one SVG per page.
+
+    Each box is nested as its own <svg> element, so it is drawn unchanged.
+    """
+    positions = layout.positions()
+    pages = []
+    for start in range(0, len(contents_svg), len(positions)):
+        boxes = contents_svg[start : start + len(positions)]
+        pages.append(_page_svg(boxes, positions, layout))
+    return pages
+
+
+def _page_svg(
+    boxes: Iterable[str], positions: list[tuple[float, float]], layout: PageLayout
+) -> str:
+    parts = [
+        f'<svg width="{layout.page_width:g}" height="{layout.page_height:g}" xmlns="http://www.w3.org/2000/svg">\n'
+    ]
+    for content_svg, (x, y) in zip(boxes, positions):
+        parts.append(content_svg.replace("<svg ", f'<svg x="{x:g}" y="{y:g}" ', 1))
+    parts.append("</svg>\n")
+    return "".join(parts)
+
+
+def impose_to_pdf(
+    boxes: Sequence[Union[str, SvgParams]],
+    page: str = "A4",
+    margin: float = MARGIN_DEFAULT,
+    gap: float = GAP_DEFAULT,
+    landscape: bool = False,
+    per_page: Optional[int] = None,
+    backend: str = "auto",
+) -> bytes:
+    """Imposes same-sized boxes (SVG content or params) onto pages of one PDF.
+
+    Conversion is one backend call for the whole document, see
+    backends.convert_pages.
+    """
+    from .backends import convert_pages
+    from .generate import create_svg_from_params
+
+    contents_svg = [
+        create_svg_from_params(box) if isinstance(box, SvgParams) else box
+        for box in boxes
+    ]
+    if not contents_svg:
+        raise ValueError("No boxes to impose")
+
+    box_width, box_height = svg_size(contents_svg[0])
+    layout = page_layout(box_width, box_height, page, margin, gap, landscape, per_page)
+    return convert_pages(impose(contents_svg, layout), backend=backend)
@@ -0,0 +1,229 @@
+import itertools
+import os
+import queue
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing.util import Finalize
+from pathlib import Path
+from typing import Iterable, Optional, Union
+
+from .profiling import profiled
+
+INKSCAPE_EXECUTABLE = "inkscape"
+SHELL_PROMPT = b"> "
+TIMEOUT_DEFAULT = 60
+# number of inkscape processes kept alive by the shared pool
+ENV_POOL_SIZE = "IDBOX_INKSCAPE_WORKERS"
+
+
+class InkscapeError(RuntimeError):
+    pass
+
+
+class InkscapeWorker:
+    """A long-lived `inkscape --shell` process that converts one file at a time.
+
+    SVG bytes are written to a private work directory instead of being
+    base64-encoded into a shell pipeline, so there is no argv length limit and
+    inkscape only starts up once. A crashed process is restarted on next use.
+    """
+
+    def __init__(
+        self,
+        executable: str = INKSCAPE_EXECUTABLE,
+        timeout: float = TIMEOUT_DEFAULT,
+    ):
+        self.executable = executable
+        self.timeout = timeout
+        # created by start() and removed by close()
+        self.work_dir: Optional[Path] = None
+        self._process: Optional[subprocess.Popen] = None
+        self._output: queue.Queue = queue.Queue()
+        self._counter = itertools.count()
+
+    @property
+    def is_alive(self) -> bool:
+        return self._process is not None and self._process.poll() is None
+
+    @profiled("inkscape_pool.startup")
+    def start(self):
+        if self.work_dir is None:
+            self.work_dir = Path(tempfile.mkdtemp(prefix="idbox-inkscape-"))
+        self._process = subprocess.Popen(
+            [self.executable, "--shell"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+        )
+        self._output = queue.Queue()
+        threading.Thread(
+            target=self._read_stdout,
+            args=(self._process.stdout, self._output),
+            daemon=True,
+        ).start()
+        self._wait_for_prompt()
+
+    @staticmethod
+    def _read_stdout(stdout, output: queue.Queue):
+        while True:
+            chunk = os.read(stdout.fileno(), 4096)
+            output.put(chunk)
+            if not chunk:
+                return
+
+    def _wait_for_prompt(self):
+        received = b""
+        while not received.endswith(SHELL_PROMPT):
+            try:
+                chunk = self._output.get(timeout=self.timeout)
+            except queue.Empty:
+                self.close()
+                raise InkscapeError(f"inkscape timed out after {self.timeout}s")
+            if not chunk:
+                self.close()
+                raise InkscapeError("inkscape exited unexpectedly")
+            received += chunk
+        return received
+
+    def _send(self, actions: list[str]):
+        self._process.stdin.write(("; ".join(actions) + "\n").encode())
+        self._process.stdin.flush()
+        self._wait_for_prompt()
+
+    def convert(
+        self, content_svg: Union[str, bytes], extension: str, dpi: int = 300
+    ) -> bytes:
+        if isinstance(content_svg, str):
+            content_svg = content_svg.encode()
+        try:
+            return self._convert(content_svg, extension, dpi)
+        except (InkscapeError, OSError):
+            # restart a crashed worker and retry once
+            self.close()
+            return self._convert(content_svg, extension, dpi)
+
+    def _convert(self, content_svg: bytes, extension: str, dpi: int) -> bytes:
+        if not self.is_alive:
+            self.start()
+        n = next(self._counter)
+        filename_input = self.work_dir / f"input-{n}.svg"
+        filename_output = self.work_dir / f"output-{n}.{extension}"
+        filename_input.write_bytes(content_svg)
+        try:
+            self._export(filename_input, filename_output, extension, dpi)
+            if not filename_output.exists():
+                raise InkscapeError(f"inkscape did not export {filename_output.name}")
+            return filename_output.read_bytes()
+        finally:
+            filename_input.unlink(missing_ok=True)
+            filename_output.unlink(missing_ok=True)
+
+    def _export(self, filename_input, filename_output, extension, dpi):
+        self._send(
+            [
+                f"file-open:{filename_input}",
+                f"export-type:{extension}",
+                f"export-dpi:{dpi}",
+                f"export-filename:{filename_output}",
+                "export-do",
+                "file-close",
+            ]
+        )
+
+    def close(self):
+        """Stops inkscape and removes the work directory, both restarted on next use."""
+        process, self._process = self._process, None
+        if process is not None:
+            try:
+                if process.poll() is None:
+                    process.stdin.write(b"quit\n")
+                    process.stdin.flush()
+                    process.wait(timeout=5)
+            except (OSError, subprocess.TimeoutExpired):
+                process.kill()
+                process.wait()
+        if self.work_dir is not None:
+            shutil.rmtree(self.work_dir, ignore_errors=True)
+            self.work_dir = None
+
+    def __del__(self):
+        self.close()
+
+
+class InkscapePool:
+    """A bounded pool of InkscapeWorker, started lazily on demand."""
+
+    def __init__(
+        self,
+        size: Optional[int] = None,
+        executable: str = INKSCAPE_EXECUTABLE,
+        timeout: float = TIMEOUT_DEFAULT,
+    ):
+        self.size = size or os.cpu_count() or 1
+        self.executable = executable
+        self.timeout = timeout
+        self._idle: queue.LifoQueue = queue.LifoQueue()
+        self._workers: list[InkscapeWorker] = []
+        self._lock = threading.Lock()
+
+    def _acquire(self) -> InkscapeWorker:
+        with self._lock:
+            if self._idle.empty() and len(self._workers) < self.size:
+                worker = InkscapeWorker(self.executable, self.timeout)
+                self._workers.append(worker)
+                return worker
+        return self._idle.get()
+
+    def convert(
+        self, content_svg: Union[str, bytes], extension: str, dpi: int = 300
+    ) -> bytes:
+        worker = self._acquire()
+        try:
+            return worker.convert(content_svg, extension, dpi=dpi)
+        finally:
+            self._idle.put(worker)
+
+    def convert_many(
+        self,
+        contents_svg: Iterable[Union[str, bytes]],
+        extension: str,
+        dpi: int = 300,
+    ) -> list[bytes]:
+        """Converts every SVG, spreading them over all workers of the pool."""
+        with ThreadPoolExecutor(max_workers=self.size) as executor:
+            return list(
+                executor.map(
+                    lambda content_svg: self.convert(content_svg, extension, dpi),
+                    contents_svg,
+                )
+            )
+
+    def close(self):
+        with self._lock:
+            for worker in self._workers:
+                worker.close()
+            self._workers.clear()
+            self._idle = queue.LifoQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+_shared_pool: Optional[InkscapePool] = None
+
+
+def get_pool() -> InkscapePool:
+    """Returns the process-wide pool, sized by IDBOX_INKSCAPE_WORKERS."""
+    global _shared_pool
+    if _shared_pool is None:
+        size = os.environ.get(ENV_POOL_SIZE)
+        _shared_pool = InkscapePool(size=int(size) if size else None)
+        # unlike atexit, multiprocessing finalizers also run in ProcessPoolExecutor workers
+        Finalize(None, _shared_pool.close, exitpriority=0)
+    return _shared_pool
@@ -1,5 +1,8 @@
+import functools
 import re
-import uuid
+from collections.abc import Mapping
+from dataclasses import dataclass
+from types import MappingProxyType
 
 COLUMN_DIVIDER = "|"
 COLUMN_SEPARATOR = ";"
@@ -13,6 +16,11 @@ regex_anonymous = re.compile(
     r"(?!$)(?P<non_embed>\+)?(?P<column_identifier>.*?)(?P<values>\[.*?\])?(?P<default_value>\(.*?\))?$"
 )
 
+# id given to each column after parsing its identifier, followed by a number
+ANONYMOUS_PREFIX = "__column_"
+# number of distinct column strings/types kept compiled by compile_columns
+CACHE_SIZE = 256
+
 WIDTH_DEFAULT = 30
 HEIGHT_DEFAULT = 30
 HEIGHT_HEADER = 40
@@ -30,19 +38,24 @@ DEFAULT_COLUMN_TYPE = {
 }
 
 
-def parse_json(data, template_data):
-    data["header"] = data.get("header", {})
-    data["fills"] = data.get("fills", [])
-    data["columns"] = data.get("columns", "")
-    data["columnTypes"] = {d["id"]: d for d in data.get("columnTypes", [])}
+def parse_json(base_data, template_data):
+    # base_data is left untouched, only what the template overrides is copied
+    column_types = base_data.get("columnTypes", [])
+    if not isinstance(column_types, Mapping):
+        column_types = {d["id"]: d for d in column_types}
+
+    data = dict(base_data)
+    data["header"] = {**base_data.get("header", {})}
+    data["fills"] = list(base_data.get("fills", []))
+    data["columns"] = base_data.get("columns", "")
+    data["columnTypes"] = dict(column_types)
 
     # update with supplied template
     data["header"].update(template_data.get("header", {}))
     data["fills"] = template_data.get("fills", data["fills"])
     data["columns"] = template_data.get("columns", data["columns"])
     for d in template_data.get("columnTypes", []):
-        data["columnTypes"][d["id"]] = data["columnTypes"].get(d["id"], {})
-        data["columnTypes"][d["id"]].update(d)
+        data["columnTypes"][d["id"]] = {**data["columnTypes"].get(d["id"], {}), **d}
 
     columns_split, default_value_position_size_triplets = parse_columns(data)
     data["columns"] = columns_split
@@ -51,11 +64,77 @@ def parse_json(data, template_data):
     return data
 
 
+@dataclass(frozen=True)
+class ColumnLayout:
+    """Columns compiled from a column string and column types, shared by every output.
+
+    Each column is stored as its sorted (key, value) items, with "values" as
+    a tuple of bubbles stored the same way, so that a layout is hashable.
+    `column_views` wraps them in read-only mappings for the template.
+    """
+
+    columns: tuple[tuple[tuple[str, object], ...], ...]
+    default_value_position_size_triplets: tuple[tuple[str, float, int], ...]
+
+    @functools.cached_property
+    def column_views(self) -> tuple[Mapping, ...]:
+        views = []
+        for items in self.columns:
+            column = dict(items)
+            column["values"] = tuple(
+                MappingProxyType(dict(value)) for value in column["values"]
+            )
+            views.append(MappingProxyType(column))
+        return tuple(views)
+
+
 def parse_columns(data):
-    column_string = data["columns"]
-    column_fills = data["fills"]
+    """Returns the (read-only) columns and default value triplets of data, see ColumnLayout."""
     column_types = data["columnTypes"]
+    key = tuple(
+        (column_id, tuple(column_type.items()))
+        for column_id, column_type in column_types.items()
+    )
+    try:
+        hash(key)
+    except TypeError:  # unhashable values in column types, compile without caching
+        layout = compile_columns.__wrapped__(data["columns"], tuple(data["fills"]), key)
+    else:
+        layout = compile_columns(data["columns"], tuple(data["fills"]), key)
+    return list(layout.column_views), list(layout.default_value_position_size_triplets)
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def compile_columns(
+    column_string: str, column_fills: tuple[str, ...], column_types: tuple
+) -> ColumnLayout:
+    """Compiles columns once per distinct input, column_types as (id, items) pairs."""
+    columns_split, default_value_position_size_triplets = _parse_columns(
+        column_string,
+        list(column_fills),
+        {column_id: dict(column_type) for column_id, column_type in column_types},
+    )
+    return ColumnLayout(
+        columns=tuple(
+            tuple(
+                sorted(
+                    {
+                        **column,
+                        "values": tuple(
+                            tuple(sorted(value.items())) for value in column["values"]
+                        ),
+                    }.items()
+                )
+            )
+            for column in columns_split
+        ),
+        default_value_position_size_triplets=tuple(
+            default_value_position_size_triplets
+        ),
+    )
+
 
+def _parse_columns(column_string, column_fills, column_types):
     # set overrides
     default_column_type = column_types.get("default", {})
     column_identifiers = regex_column.split(column_string)
@@ -179,7 +258,8 @@ def parse_values(value_string):
 
 
 def get_uid(reserved_keys=set()):
-    uid = uuid.uuid4().hex
-    while uid in reserved_keys:
-        uid = uuid.uuid4().hex
-    return uid
+    # deterministic, so that the same columns always compile to the same layout
+    n = len(reserved_keys)
+    while f"{ANONYMOUS_PREFIX}{n}" in reserved_keys:
+        n += 1
+    return f"{ANONYMOUS_PREFIX}{n}"
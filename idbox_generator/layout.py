@@ -0,0 +1,134 @@
+import json
+from io import BytesIO
+from pathlib import Path
+from typing import Union
+
+from .types import SvgParams
+
+# bumped whenever a key or array of the manifest changes meaning
+MANIFEST_VERSION = 1
+MANIFEST_FORMATS = ("json", "npz")
+# names of the markers of SvgParams.data_matrices, in order
+ANCHOR_NAMES = ("data_matrix", "aruco")
+
+
+def layout_manifest(params: SvgParams) -> dict:
+    """Returns where every bubble and marker of a box is, for OMR readers to sample directly.
+
+    Coordinates are SVG pixels from the top-left of the box. Bubbles are
+    listed as parallel arrays, one entry per drawn bubble, with `anchor_u` and
+    `anchor_v` placing each center relative to the anchors: (0, 0) is the
+    top-left corner of the data matrix and (1, 1) the bottom-right corner of
+    the ArUco stub, so that a reader only needs to locate both markers.
+    """
+    anchors = {
+        name: {
+            "left": data_matrix.left,
+            "top": data_matrix.top,
+            "width": data_matrix.width,
+            "height": data_matrix.height,
+            "margin": data_matrix.margin,
+        }
+        for name, data_matrix in zip(ANCHOR_NAMES, params.data_matrices)
+    }
+    first, last = params.data_matrices[0], params.data_matrices[-1]
+    origin_x, origin_y = first.left, first.top
+    span_x = last.left + last.width - origin_x
+    span_y = last.top + last.height - origin_y
+
+    bubbles = {
+        "field": [],
+        "column": [],
+        "row": [],
+        "value": [],
+        "center_x": [],
+        "center_y": [],
+        "radius_x": [],
+        "radius_y": [],
+        "anchor_u": [],
+        "anchor_v": [],
+    }
+    for i, column in enumerate(params.columns):
+        for j, bubble in enumerate(column.values):
+            if bubble.isHidden:
+                continue
+            bubbles["field"].append(column.fieldIndex)
+            bubbles["column"].append(i)
+            bubbles["row"].append(j)
+            bubbles["value"].append(bubble.value)
+            bubbles["center_x"].append(bubble.center_x)
+            bubbles["center_y"].append(bubble.center_y)
+            bubbles["radius_x"].append(bubble.radius_x)
+            bubbles["radius_y"].append(bubble.radius_y)
+            bubbles["anchor_u"].append((bubble.center_x - origin_x) / span_x)
+            bubbles["anchor_v"].append((bubble.center_y - origin_y) / span_y)
+
+    return {
+        "version": MANIFEST_VERSION,
+        "width": params.width_max,
+        "height": params.height_max,
+        "anchors": anchors,
+        "bubbles": bubbles,
+    }
+
+
+def manifest_to_json(params: SvgParams) -> bytes:
+    return json.dumps(layout_manifest(params), separators=(",", ":")).encode()
+
+
+def manifest_to_npz(params: SvgParams) -> bytes:
+    """Same as manifest_to_json, as compressed NumPy arrays.
+
+    Bubble arrays keep their names, prefixed with "bubble_", and anchors are an
+    array of (left, top, width, height, margin) rows in ANCHOR_NAMES order.
+    """
+    import numpy as np
+
+    manifest = layout_manifest(params)
+    bubbles = manifest["bubbles"]
+    arrays = {
+        "version": np.array(manifest["version"]),
+        "size": np.array([manifest["width"], manifest["height"]], dtype=np.float32),
+        "anchors": np.array(
+            [
+                [
+                    anchor["left"],
+                    anchor["top"],
+                    anchor["width"],
+                    anchor["height"],
+                    anchor["margin"],
+                ]
+                for anchor in manifest["anchors"].values()
+            ],
+            dtype=np.float32,
+        ),
+        "bubble_value": np.array(bubbles["value"], dtype=str),
+    }
+    for name in ("field", "column", "row"):
+        arrays[f"bubble_{name}"] = np.array(bubbles[name], dtype=np.int32)
+    for name in (
+        "center_x",
+        "center_y",
+        "radius_x",
+        "radius_y",
+        "anchor_u",
+        "anchor_v",
+    ):
+        arrays[f"bubble_{name}"] = np.array(bubbles[name], dtype=np.float32)
+
+    npz_buffer = BytesIO()
+    np.savez_compressed(npz_buffer, **arrays)
+    return npz_buffer.getvalue()
+
+
+def save_manifest(params: SvgParams, filename: Union[str, Path], format=None) -> str:
+    """Writes the layout manifest of params, as json or npz from the filename by default."""
+    format = format or Path(filename).suffix[1:]
+    if format not in MANIFEST_FORMATS:
+        raise ValueError(
+            f"Unsupported manifest format {format}, use one of {MANIFEST_FORMATS}"
+        )
+    content = manifest_to_npz(params) if format == "npz" else manifest_to_json(params)
+    with open(filename, "wb") as f:
+        f.write(content)
+    return str(filename)
@@ -0,0 +1,219 @@
+import dataclasses
+import filecmp
+import functools
+import hashlib
+import json
+import logging
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+logger = logging.getLogger(__name__)
+
+_CURRENT_DIR = Path(__file__).parent.absolute()
+
+# default directory of the CLI --cache-dir flag
+ENV_CACHE_DIR = "IDBOX_CACHE_DIR"
+MAX_BYTES_DEFAULT = 1 << 30  # 1 GiB
+# files whose content changes every output, hashed into every key, including the
+# modules laying out and drawing a box so that editing them invalidates the cache
+_KEYED_FILES = (
+    _CURRENT_DIR / "assets" / "template.svg",
+    _CURRENT_DIR / "data" / "default.json",
+    *(
+        _CURRENT_DIR / f"{module}.py"
+        for module in (
+            "aruco_table",
+            "converter",
+            "datamatrix",
+            "generate",
+            "json_parser",
+            "raster",
+            "schema_handler",
+            "stamp",
+            "template_cache",
+            "types",
+        )
+    ),
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _version() -> str:
+    from importlib.metadata import PackageNotFoundError, version
+
+    try:
+        return version("idbox_generator")
+    except PackageNotFoundError:
+        return "0"
+
+
+@functools.lru_cache(maxsize=None)
+def _environment_digest() -> str:
+    """Digest of the package version, template.svg, default.json and the rendering modules."""
+    digest = hashlib.sha256(_version().encode())
+    for path in _KEYED_FILES:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
+
+
+def _normalize(obj):
+    # plain JSON with sorted keys, slotted params and marker tiles included
+    if isinstance(obj, dict):
+        return {str(key): _normalize(value) for key, value in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_normalize(value) for value in obj]
+    if isinstance(obj, bytes):
+        return obj.hex()
+    if hasattr(obj, "__slots__"):
+        return {
+            name: _normalize(getattr(obj, name))
+            for name in obj.__slots__
+            if not name.startswith("_")
+        }
+    if dataclasses.is_dataclass(obj):
+        return {
+            f.name: _normalize(getattr(obj, f.name)) for f in dataclasses.fields(obj)
+        }
+    return obj
+
+
+def cache_key(inputs, extension: str, dpi: int = 300, backend=None) -> str:
+    """Returns the content hash of an output, from everything it is rendered from.
+
+    `inputs` is anything identifying the box (template data, a schema, params,
+    per-student rows or SVG content), normalized to JSON with sorted keys.
+    """
+    payload = json.dumps(
+        [_normalize(inputs), extension, dpi, backend],
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    digest = hashlib.sha256(_environment_digest().encode())
+    digest.update(payload.encode())
+    return digest.hexdigest()
+
+
+class OutputCache:
+    """Generated files on disk, addressed by cache_key.
+
+    Entries are stored as <directory>/<key[:2]>/<key>.<extension>. Hits refresh
+    the modification time, and `evict` removes the least recently used entries
+    until the directory holds at most `max_bytes`.
+    """
+
+    def __init__(self, directory: Union[str, Path], max_bytes: int = MAX_BYTES_DEFAULT):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+    def path(self, key: str, extension: str) -> Path:
+        return self.directory / key[:2] / f"{key}.{extension}"
+
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _touch(self, path: Path) -> bool:
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def get(self, key: str, extension: str) -> Optional[bytes]:
+        path = self.path(key, extension)
+        try:
+            content = path.read_bytes()
+        except FileNotFoundError:
+            self._count(hit=False)
+            return None
+        self._touch(path)
+        self._count(hit=True)
+        return content
+
+    def put(self, key: str, extension: str, content: bytes):
+        path = self.path(key, extension)
+        os.makedirs(path.parent, exist_ok=True)
+        # written aside and renamed, so that readers never see partial files
+        path_tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        path_tmp.write_bytes(content)
+        os.replace(path_tmp, path)
+
+    def copy_to(self, key: str, extension: str, filename_output) -> bool:
+        """Copies a cached entry to filename_output, skipping it if already identical.
+
+        Returns False on a miss.
+        """
+        path = self.path(key, extension)
+        if not self._touch(path):
+            self._count(hit=False)
+            return False
+        self._count(hit=True)
+        if os.path.exists(filename_output) and filecmp.cmp(
+            path, filename_output, shallow=False
+        ):
+            return True
+        shutil.copyfile(path, filename_output)
+        return True
+
+    def put_file(self, key: str, extension: str, filename: Union[str, Path]):
+        self.put(key, extension, Path(filename).read_bytes())
+
+    def size(self) -> int:
+        return sum(path.stat().st_size for path in self._entries())
+
+    def _entries(self) -> list[Path]:
+        if not self.directory.is_dir():
+            return []
+        return [
+            path
+            for path in self.directory.glob("??/*")
+            if path.is_file() and not path.name.endswith(".tmp")
+        ]
+
+    def evict(self) -> int:
+        """Removes least recently used entries beyond max_bytes, returns how many."""
+        entries = []
+        for path in self._entries():
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        entries.sort()
+        total = sum(size for _, size, _ in entries)
+        evicted = 0
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            total -= size
+            evicted += 1
+        with self._lock:
+            self.evictions += evicted
+        if evicted:
+            logger.info("Evicted %d cached file(s) from %s", evicted, self.directory)
+        return evicted
+
+    def stats(self) -> dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def summary(self) -> str:
+        return f"cache: {self.hits} hit(s), {self.misses} miss(es), {self.evictions} evicted"
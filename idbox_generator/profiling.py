@@ -0,0 +1,177 @@
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+# Stages are named "<area>.<step>", e.g. "generate.render" or "save_to.write".
+# Recording is off until enable(), so that instrumented code only pays for a
+# flag check.
+
+FORMATS = ("json", "chrome")
+
+_lock = threading.Lock()
+_enabled = False
+_trace = False
+# name -> [calls, seconds, bytes]
+_totals: dict[str, list] = {}
+# complete events of the chrome trace format, only kept with trace=True
+_events: list[dict] = []
+_hooks: list[Callable[[str, float, int], None]] = []
+
+
+def enable(trace: bool = False):
+    """Starts recording stages, and every call of each stage with `trace`."""
+    global _enabled, _trace
+    _enabled = True
+    _trace = trace
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def is_tracing() -> bool:
+    return _enabled and _trace
+
+
+def add_hook(hook: Callable[[str, float, int], None]):
+    """Calls hook(name, seconds, bytes) after every stage recorded in this process.
+
+    Hooks run even when recording is off, e.g. to feed a metrics exporter.
+    """
+    with _lock:
+        _hooks.append(hook)
+
+
+def remove_hook(hook: Callable[[str, float, int], None]):
+    with _lock:
+        _hooks.remove(hook)
+
+
+def record(name: str, start: float, seconds: float, nbytes: int = 0):
+    """Records one call of a stage that started at perf_counter() `start`."""
+    with _lock:
+        if _enabled:
+            totals = _totals.setdefault(name, [0, 0.0, 0])
+            totals[0] += 1
+            totals[1] += seconds
+            totals[2] += nbytes
+            if _trace:
+                _events.append(
+                    {
+                        "name": name,
+                        "ph": "X",
+                        "ts": start * 1e6,
+                        "dur": seconds * 1e6,
+                        "pid": os.getpid(),
+                        "tid": threading.get_ident(),
+                        "args": {"bytes": nbytes},
+                    }
+                )
+        hooks = list(_hooks)
+    for hook in hooks:
+        hook(name, seconds, nbytes)
+
+
+def _is_active() -> bool:
+    return _enabled or bool(_hooks)
+
+
+class _Stage:
+    __slots__ = ("bytes",)
+
+    def __init__(self):
+        self.bytes = 0
+
+
+@contextmanager
+def stage(name: str):
+    """Times the body as one call of a stage, setting `.bytes` counts its output."""
+    current = _Stage()
+    if not _is_active():
+        yield current
+        return
+    start = time.perf_counter()
+    try:
+        yield current
+    finally:
+        record(name, start, time.perf_counter() - start, current.bytes)
+
+
+def profiled(name: str):
+    """Decorates a function as a stage, counting the length of str/bytes results."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _is_active():
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            result = func(*args, **kwargs)
+            nbytes = len(result) if isinstance(result, (str, bytes)) else 0
+            record(name, start, time.perf_counter() - start, nbytes)
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+def stats() -> dict[str, dict[str, float]]:
+    """Returns calls, seconds and bytes per stage recorded so far."""
+    with _lock:
+        return {
+            name: {"calls": calls, "seconds": seconds, "bytes": nbytes}
+            for name, (calls, seconds, nbytes) in sorted(_totals.items())
+        }
+
+
+def reset():
+    with _lock:
+        _totals.clear()
+        _events.clear()
+
+
+def drain() -> Optional[dict]:
+    """Returns and clears what was recorded, for a worker process to hand to merge."""
+    if not _enabled:
+        return None
+    with _lock:
+        snapshot = {"totals": dict(_totals), "events": list(_events)}
+        _totals.clear()
+        _events.clear()
+    return snapshot
+
+
+def merge(snapshot: Optional[dict]):
+    """Adds what drain returned in another process to this one."""
+    if not snapshot:
+        return
+    with _lock:
+        for name, (calls, seconds, nbytes) in snapshot["totals"].items():
+            totals = _totals.setdefault(name, [0, 0.0, 0])
+            totals[0] += calls
+            totals[1] += seconds
+            totals[2] += nbytes
+        _events.extend(snapshot["events"])
+
+
+def chrome_trace() -> dict:
+    """Returns the recorded calls in the Trace Event Format of chrome://tracing and Perfetto."""
+    with _lock:
+        return {"traceEvents": list(_events), "displayTimeUnit": "ms"}
+
+
+def write_profile(filename, format: str = "json"):
+    """Writes stats() as JSON, or with format "chrome" the chrome_trace()."""
+    content = chrome_trace() if format == "chrome" else stats()
+    with open(filename, "w") as f:
+        json.dump(content, f, indent=2)
@@ -0,0 +1,366 @@
+import functools
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+import numpy as np
+from PIL import Image, ImageColor, ImageDraw, ImageFont
+
+from .profiling import profiled
+from .types import SvgParams, TileGrid
+
+# PNGs are drawn straight from SvgParams with the RASTER_BACKEND of backends.py,
+# instead of serializing an SVG for cairo
+SCALE_DEFAULT = 2  # same pixel size as converter.convert_svg_to_png
+# pixels per SVG unit are dpi / CSS_DPI when a dpi is given, as converter.rasterize_svg
+CSS_DPI = 96
+CORNER_RADIUS = 10
+GLYPH_CACHE_SIZE = 4096
+# number of (schema, scale) backgrounds kept by get_raster_stamp
+STAMP_CACHE_SIZE = 32
+
+# font files for the families of template.svg, tried in order before Pillow's own
+FONT_FILES = {
+    ("monospace", "normal"): ("DejaVuSansMono.ttf", "LiberationMono-Regular.ttf"),
+    ("monospace", "bold"): ("DejaVuSansMono-Bold.ttf", "LiberationMono-Bold.ttf"),
+    ("sans-serif", "normal"): ("DejaVuSans.ttf", "LiberationSans-Regular.ttf"),
+    ("sans-serif", "bold"): ("DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf"),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def get_font(family: str, weight: str, size: int) -> ImageFont.FreeTypeFont:
+    is_bold = weight in ("bold", "bolder") or (weight.isdigit() and int(weight) >= 600)
+    weight = "bold" if is_bold else "normal"
+    for filename in FONT_FILES[(family, weight)]:
+        try:
+            return ImageFont.truetype(filename, size)
+        except OSError:
+            continue
+    return ImageFont.load_default(size=size)
+
+
+@functools.lru_cache(maxsize=GLYPH_CACHE_SIZE)
+def get_glyphs(
+    text: str, family: str, weight: str, size: int, anchor: str
+) -> tuple[Image.Image, int, int]:
+    """Returns the coverage mask of text and its offset from the anchor point."""
+    font = get_font(family, weight, size)
+    left, top, right, bottom = font.getbbox(text, anchor=anchor)
+    mask = Image.new("L", (max(1, right - left), max(1, bottom - top)))
+    ImageDraw.Draw(mask).text((-left, -top), text, fill=255, font=font, anchor=anchor)
+    return mask, left, top
+
+
+def _color(value: Optional[str]) -> Optional[tuple[int, int, int, int]]:
+    if not value or value == "none":
+        return None
+    return ImageColor.getcolor(value, "RGBA")
+
+
+class _Canvas:
+    def __init__(self, width: float, height: float, scale: float, image=None):
+        self.scale = scale
+        self.image = image or Image.new(
+            "RGBA", (round(width * scale), round(height * scale)), (0, 0, 0, 0)
+        )
+        self.draw = ImageDraw.Draw(self.image)
+
+    def rect(self, x0, y0, x1, y1, fill, corners=(False, False, False, False)):
+        s = self.scale
+        box = (round(x0 * s), round(y0 * s), round(x1 * s) - 1, round(y1 * s) - 1)
+        if box[2] < box[0] or box[3] < box[1]:
+            return
+        if any(corners):
+            self.draw.rounded_rectangle(
+                box, CORNER_RADIUS * s, fill=fill, corners=corners
+            )
+        else:
+            self.draw.rectangle(box, fill=fill)
+
+    def ellipse(self, cx, cy, rx, ry, fill, stroke, stroke_width=1):
+        s = self.scale
+        half = stroke_width / 2
+        self.draw.ellipse(
+            (
+                (cx - rx - half) * s,
+                (cy - ry - half) * s,
+                (cx + rx + half) * s - 1,
+                (cy + ry + half) * s - 1,
+            ),
+            fill=fill,
+            outline=stroke,
+            width=max(1, round(stroke_width * s)),
+        )
+
+    def text(self, x, y, text, family, weight, size, fill, anchor="mm"):
+        if not text or fill is None:
+            return
+        s = self.scale
+        mask, left, top = get_glyphs(text, family, weight, round(size * s), anchor)
+        self.image.paste(fill, (round(x * s) + left, round(y * s) + top), mask)
+
+    def tiles(self, tiles: TileGrid, left, top, width, height):
+        if len(tiles) == 0:
+            return
+        if not isinstance(tiles, TileGrid):
+            tiles = TileGrid.from_tiles(tiles)
+        s = self.scale
+        bits = np.unpackbits(np.frombuffer(tiles.packed, dtype=np.uint8))
+        is_white = bits[: tiles.num_rows * tiles.num_columns].reshape(
+            tiles.num_rows, tiles.num_columns
+        )
+        # pixel edges of every tile, so that adjacent tiles never overlap or gap
+        edges_x = np.round(
+            (left + np.arange(tiles.num_columns + 1) * width / tiles.num_columns) * s
+        ).astype(int)
+        edges_y = np.round(
+            (top + np.arange(tiles.num_rows + 1) * height / tiles.num_rows) * s
+        ).astype(int)
+        columns = np.searchsorted(edges_x, np.arange(edges_x[0], edges_x[-1]), "right")
+        rows = np.searchsorted(edges_y, np.arange(edges_y[0], edges_y[-1]), "right")
+        is_black = is_white[rows[:, None] - 1, columns[None, :] - 1] == 0
+        mask = Image.fromarray(is_black.astype(np.uint8) * 255, "L")
+        self.image.paste((0, 0, 0, 255), (int(edges_x[0]), int(edges_y[0])), mask)
+
+
+BLACK = (0, 0, 0, 255)
+WHITE = (255, 255, 255, 255)
+
+
+def _draw_bubble(canvas: _Canvas, params: SvgParams, i, j, column, bubble, shaded):
+    if not bubble.isHidden:
+        canvas.ellipse(
+            bubble.center_x,
+            bubble.center_y,
+            bubble.radius_x,
+            bubble.radius_y,
+            fill=BLACK if shaded else WHITE,
+            stroke=BLACK,
+        )
+    canvas.text(
+        (i + 0.5 * (1 + bubble.isLabel)) * params.width_box,
+        (j + 0.5) * params.height_box + params.header.height + params.height_writing,
+        bubble.value,
+        "monospace",
+        column.fontWeight,
+        column.fontSize,
+        _color(column.color),
+        anchor="rm" if column.hideCircle else "mm",
+    )
+
+
+def _draw_default_values(canvas: _Canvas, params: SvgParams):
+    header = params.header
+    for value, position, font_size in params.default_value_position_size_triplets:
+        canvas.text(
+            position * params.width_box,
+            header.height + 0.5 * params.height_writing,
+            value,
+            "monospace",
+            header.fontWeight,
+            font_size,
+            BLACK,
+        )
+
+
+def _draw_marker_tiles(canvas: _Canvas, data_matrix):
+    canvas.tiles(
+        data_matrix.tiles,
+        data_matrix.left,
+        data_matrix.top,
+        data_matrix.width,
+        data_matrix.height,
+    )
+
+
+@profiled("raster.draw")
+def rasterize_params(
+    params: SvgParams, scale: float = SCALE_DEFAULT, layer: Optional[str] = None
+) -> Image.Image:
+    """Draws the box of template.svg into an RGBA image, without an SVG in between.
+
+    With layer "static", bubbles are unshaded and default values and marker
+    tiles are left out, as in template.svg, see RasterStamp.
+    """
+    is_static = layer == "static"
+    canvas = _Canvas(params.width_max, params.height_max, scale)
+    header = params.header
+    width_box, height_box = params.width_box, params.height_box
+    width_max, height_max = params.width_max, params.height_max
+    top_bubbles = header.height + params.height_writing
+
+    # vertical fills, rounded on the bottom-left of the first column
+    for i, column in enumerate(params.columns):
+        fill = _color(column.fill)
+        if fill is not None:
+            canvas.rect(
+                i * width_box,
+                height_box,
+                (i + 1) * width_box,
+                height_max,
+                fill,
+                corners=(False, False, False, i == 0),
+            )
+
+    for i, column in enumerate(params.columns):
+        for j, bubble in enumerate(column.values):
+            shaded = bubble.isShaded and not is_static
+            _draw_bubble(canvas, params, i, j, column, bubble, shaded)
+
+    canvas.rect(
+        0,
+        0,
+        width_max,
+        header.height,
+        _color(header.fill),
+        corners=(True, True, False, False),
+    )
+    canvas.text(
+        (header.height + width_max) / 2,
+        header.height / 2,
+        header.value,
+        "sans-serif",
+        header.fontWeight,
+        header.fontSize,
+        _color(header.color),
+    )
+    canvas.rect(
+        0,
+        height_max - params.footer_height,
+        width_max,
+        height_max,
+        _color(header.fill),
+        corners=(False, False, False, True),
+    )
+
+    if not is_static:
+        _draw_default_values(canvas, params)
+
+    for data_matrix in params.data_matrices:
+        margin = data_matrix.margin
+        canvas.rect(
+            data_matrix.left - margin,
+            data_matrix.top - margin,
+            data_matrix.left + data_matrix.width + margin,
+            data_matrix.top + data_matrix.height + margin,
+            WHITE,
+        )
+        if not is_static:
+            _draw_marker_tiles(canvas, data_matrix)
+
+    # grid lines are 1 wide, centred on their coordinate
+    for i, column in enumerate(params.columns, start=1):
+        if column.hasDivider:
+            x = i * width_box
+            canvas.rect(
+                x - 0.5, top_bubbles, x + 0.5, height_max - params.footer_height, BLACK
+            )
+    for y in (header.height, top_bubbles):
+        canvas.rect(0, y - 0.5, width_max, y + 0.5, BLACK)
+
+    # outer box, a stroke 2 wide of which only the inner half is visible
+    s = scale
+    canvas.draw.rounded_rectangle(
+        (-s, -s, round(width_max * s) + s - 1, round(height_max * s) + s - 1),
+        (CORNER_RADIUS + 1) * s,
+        outline=BLACK,
+        width=round(2 * s),
+    )
+    return canvas.image
+
+
+class RasterStamp:
+    """The static layer of a box, rasterized once and stamped with each student's parts.
+
+    Each variant copies the cached bitmap and only draws its shaded bubbles,
+    default values and marker tiles into it, as stamp.SvgStamp does for SVG.
+    """
+
+    def __init__(self, params: SvgParams, scale: float = SCALE_DEFAULT):
+        from .stamp import can_stamp
+
+        self.scale = scale
+        self.background = (
+            rasterize_params(params, scale=scale, layer="static")
+            if can_stamp(params)
+            else None
+        )
+
+    def render(self, params: SvgParams) -> Image.Image:
+        """Draws a variant of the params this stamp was created from."""
+        if self.background is None:
+            return rasterize_params(params, scale=self.scale)
+        canvas = _Canvas(
+            params.width_max, params.height_max, self.scale, self.background.copy()
+        )
+        for i, column in enumerate(params.columns):
+            for j, bubble in enumerate(column.values):
+                if bubble.isShaded and not bubble.isHidden:
+                    _draw_bubble(canvas, params, i, j, column, bubble, True)
+        _draw_default_values(canvas, params)
+        for data_matrix in params.data_matrices:
+            _draw_marker_tiles(canvas, data_matrix)
+        return canvas.image
+
+
+_lock = threading.Lock()
+_stamps: "OrderedDict[Hashable, RasterStamp]" = OrderedDict()
+
+
+def get_raster_stamp(
+    params: SvgParams,
+    cache_key: Optional[Hashable] = None,
+    scale: float = SCALE_DEFAULT,
+) -> RasterStamp:
+    """Returns the cached raster stamp of params' schema at scale, see stamp.get_stamp."""
+    from .stamp import static_key
+
+    key = (cache_key if cache_key is not None else static_key(params), scale)
+    with _lock:
+        stamp = _stamps.get(key)
+        if stamp is not None:
+            _stamps.move_to_end(key)
+            return stamp
+
+    stamp = RasterStamp(params, scale)
+    with _lock:
+        _stamps[key] = stamp
+        while len(_stamps) > STAMP_CACHE_SIZE:
+            _stamps.popitem(last=False)
+    return stamp
+
+
+@profiled("raster.encode")
+def encode_png(img: Image.Image, compress_level: int = 1) -> bytes:
+    from io import BytesIO
+
+    png_buffer = BytesIO()
+    img.save(png_buffer, "PNG", compress_level=compress_level)
+    return png_buffer.getvalue()
+
+
+def convert_params_to_png(
+    params: SvgParams, dpi: Optional[int] = None, compress_level=1
+) -> bytes:
+    """Same as convert_svg_to_png on the rendered SVG, within a pixel-diff tolerance.
+
+    Drawn at SCALE_DEFAULT unless a `dpi` is given. Encoding dominates drawing,
+    so zlib runs at its fastest level by default.
+    """
+    return encode_png(rasterize_params(params, scale=_scale(dpi)), compress_level)
+
+
+def convert_params_to_png_stamped(
+    params: SvgParams,
+    cache_key: Optional[Hashable] = None,
+    dpi: Optional[int] = None,
+    compress_level=1,
+) -> bytes:
+    """Same as convert_params_to_png, reusing the static bitmap across variants."""
+    stamp = get_raster_stamp(params, cache_key, _scale(dpi))
+    return encode_png(stamp.render(params), compress_level)
+
+
+def _scale(dpi: Optional[int]) -> float:
+    return SCALE_DEFAULT if dpi is None else dpi / CSS_DPI
@@ -1,112 +1,236 @@
-import base64
-import inspect
+from typing import Iterable, Optional
 
-IMAGE_NAME = "noto-inkscape"
-IMAGE_TAG = "1.3"
-IMAGE_IDENTIFIER = f"{IMAGE_NAME}:{IMAGE_TAG}"
+from . import backends
+from .profiling import profiled, stage
 
 
-def execute_local(command):
-    # use local inkscape installation
-    import subprocess
+def inkscape_pipe_command(extension, dpi=300) -> list[str]:
+    return [
+        "inkscape",
+        "--pipe",
+        f"--export-dpi={dpi}",
+        f"--export-type={extension}",
+        "--export-filename=-",
+    ]
 
-    try:
-        output = subprocess.run(
-            command,
-            capture_output=True,
-            shell=True,
-            text=True,
-        )
-    except Exception:
-        import traceback
 
-        traceback.print_exc()
+@profiled("save_to.inkscape")
+def execute_local_pipe(content_svg, extension, dpi=300):
+    # stream the svg through stdin/stdout, without a shell or base64 round-trip
+    import subprocess
+
+    output = subprocess.run(
+        inkscape_pipe_command(extension, dpi),
+        input=content_svg.encode(),
+        capture_output=True,
+    )
     assert output.returncode == 0, f"Error running inkscape locally: {output.stderr}"
     return output.stdout
 
 
-def execute_docker(command):
-    # Fallback to docker, since cannot guarantee every user to have inkscape installed
-    # Docker CLI (comes with Docker Desktop) will need to be installed: https://docs.docker.com/engine/install/
-    import docker  # pip install docker
+def convert_svg(content_svg, extension, dpi=300, use_local=True, use_pool=False):
+    """Converts SVG content to the given extension type using inkscape.
 
-    client = docker.from_env()
-    container = client.containers.run(
-        IMAGE_IDENTIFIER,
-        command=f'sh -c "{command}"',
-        remove=True,  # Remove container after execution
-        stdout=True,
-        stderr=True,
+    With use_pool, the conversion goes to a long-lived inkscape worker from
+    inkscape_pool.get_pool() instead of starting a new inkscape process.
+    Falls back to other backends on failure, see backends.convert.
+    """
+    backend = "inkscape-pool" if use_pool else "inkscape"
+    return backends.convert(
+        content_svg, extension, dpi=dpi, backend=backend if use_local else "docker"
     )
-    return container
 
 
-def convert_svg(content_svg, extension, dpi=300, use_local=True):
-    """Converts SVG content to the given extension type using inkscape."""
-    base64_svg = base64.b64encode(content_svg.encode()).decode()
-    command = f"echo '{base64_svg}' | base64 -d | inkscape --pipe --export-dpi={dpi} --export-type={extension} --export-filename=- 2>/dev/null | base64"
-    try:
-        assert use_local, "Skip using local inkscape"
-        base64_output = execute_local(command)
-        print("Generated using local inkscape")
-    except Exception as e:
-        print(e)
-        base64_output = execute_docker(command)
-        print("Generated using docker inkscape")
-    content_output = base64.b64decode(base64_output)
-    return content_output
+def svg_to_bytes(
+    content_svg, extension, dpi=300, use_local=True, use_pool=False, backend=None
+):
+    """Converts SVG content to the bytes of the given extension, without touching disk.
 
+    `backend` names a backend from the registry in backends.py, or "auto" for
+    the fastest available one. None keeps use_local/use_pool deciding, see
+    backends.resolve_backend.
+    """
+    with stage(f"save_to.convert.{extension}") as current:
+        backend = backends.resolve_backend(extension, backend, use_local, use_pool)
+        if backend is None:
+            content = content_svg.encode()
+        else:
+            content = backends.convert(content_svg, extension, dpi=dpi, backend=backend)
+        current.bytes = len(content)
+    return content
 
-def save_to_svg(filename, content_svg, dpi=None, use_local=None):
-    with open(filename, "w") as f:
-        f.write(content_svg)
 
+def convert_to_svg(
+    content_svg, dpi=None, use_local=None, use_pool=None, backend=None
+) -> bytes:
+    return content_svg.encode()
 
-def save_to_png(filename, content_svg, dpi=300, use_local=True):
-    if use_local:
-        save_to_png_local(filename, content_svg, dpi=dpi)
-    else:
-        content = convert_svg(content_svg, "png", dpi=dpi, use_local=use_local)
-        with open(filename, "wb") as f:
-            f.write(content)
 
+def convert_to_png(
+    content_svg, dpi=300, use_local=True, use_pool=False, backend=None
+) -> bytes:
+    return svg_to_bytes(content_svg, "png", dpi, use_local, use_pool, backend)
 
-def save_to_png_local(filename, content_svg, dpi=300, scale=2):
-    from cairosvg import svg2png
 
-    svg2png(bytestring=content_svg, write_to=filename, dpi=dpi, scale=scale)
+def convert_to_pdf(
+    content_svg, dpi=300, use_local=True, use_pool=False, backend=None
+) -> bytes:
+    return svg_to_bytes(content_svg, "pdf", dpi, use_local, use_pool, backend)
 
 
-def save_to_pdf(filename, content_svg, dpi=None, use_local=True):
-    content = convert_svg(content_svg, "pdf", use_local=use_local)
-    with open(filename, "wb") as f:
-        f.write(content)
+def convert_to_jpg(
+    content_svg, dpi=300, use_local=True, use_pool=False, backend=None
+) -> bytes:
+    return svg_to_bytes(content_svg, "jpg", dpi, use_local, use_pool, backend)
 
 
-def save_to_jpg(filename, content_svg, dpi=300, use_local=True):
-    from io import BytesIO
+def write_bytes(filename, content: bytes):
+    """Writes a converted file, recorded as the save_to.write stage."""
+    with stage("save_to.write") as current, open(filename, "wb") as f:
+        current.bytes = f.write(content)
 
-    from PIL import Image
 
-    content = convert_svg(content_svg, "png", dpi=dpi, use_local=use_local)
-    png_buffer = BytesIO(content)
-    with Image.open(png_buffer) as img:
-        if img.mode in ("RGBA", "LA"):
-            bg = Image.new("RGB", img.size, (255, 255, 255))
-            bg.paste(img, img)
-            img = bg
-        img.save(filename, "JPEG")
+def save_to_svg(
+    filename, content_svg, dpi=None, use_local=None, use_pool=None, backend=None
+):
+    with stage("save_to.write") as current, open(filename, "w") as f:
+        current.bytes = f.write(content_svg)
 
 
-# functions should have the following signature:
-# def save_to_<extension_type>(filename, content_svg)
+def save_to_png(
+    filename, content_svg, dpi=300, use_local=True, use_pool=False, backend=None
+):
+    content = convert_to_png(content_svg, dpi, use_local, use_pool, backend)
+    write_bytes(filename, content)
 
-FUNCTION_PREFIX = "save_to_"
 
-SUPPORTED_EXTENSIONS = {}
-for name, obj in list(globals().items()):
-    if inspect.isfunction(obj) and name.startswith(FUNCTION_PREFIX):
-        SUPPORTED_EXTENSIONS[name[len(FUNCTION_PREFIX) :]] = obj
+def save_to_png_local(
+    filename,
+    content_svg,
+    dpi=300,
+    scale=2,
+    use_local=None,
+    use_pool=None,
+    backend=None,
+):
+    from cairosvg import svg2png
+
+    svg2png(bytestring=content_svg, write_to=filename, dpi=dpi, scale=scale)
+
+
+def save_to_pdf(
+    filename, content_svg, dpi=300, use_local=True, use_pool=False, backend=None
+):
+    content = convert_to_pdf(content_svg, dpi, use_local, use_pool, backend)
+    write_bytes(filename, content)
+
+
+def save_to_jpg(
+    filename, content_svg, dpi=300, use_local=True, use_pool=False, backend=None
+):
+    content = convert_to_jpg(content_svg, dpi, use_local, use_pool, backend)
+    write_bytes(filename, content)
+
+
+# writers by extension: save_to_<extension>(filename, content_svg, dpi, ...)
+SUPPORTED_EXTENSIONS = {
+    "svg": save_to_svg,
+    "png": save_to_png,
+    "png_local": save_to_png_local,
+    "pdf": save_to_pdf,
+    "jpg": save_to_jpg,
+}
+# converters by extension: convert_to_<extension>(content_svg, dpi, ...) -> bytes
+SUPPORTED_FORMATS = {
+    "svg": convert_to_svg,
+    "png": convert_to_png,
+    "pdf": convert_to_pdf,
+    "jpg": convert_to_jpg,
+}
+
+# "svg,png@150,png@300,pdf": formats separated by commas, each with an optional dpi
+FORMAT_SEPARATOR = ","
+FORMAT_DPI_SEPARATOR = "@"
+# rasterized once per svg_to_formats call and resampled for each dpi
+RASTER_EXTENSIONS = ("png", "jpg")
+
+
+def parse_formats(spec: str) -> list[tuple[str, Optional[int]]]:
+    """Parses a format list into (extension, dpi) pairs, dpi None where not given."""
+    formats = []
+    for item in spec.split(FORMAT_SEPARATOR):
+        extension, _, dpi = item.strip().partition(FORMAT_DPI_SEPARATOR)
+        if extension not in SUPPORTED_FORMATS:
+            raise ValueError(
+                f"Unsupported format {extension}, use one of {list(SUPPORTED_FORMATS)}"
+            )
+        if dpi and not (dpi.isdigit() and int(dpi) > 0):
+            raise ValueError(
+                f"Invalid dpi {dpi!r} in {item.strip()!r}, use a positive integer as in png{FORMAT_DPI_SEPARATOR}300"
+            )
+        formats.append((extension, int(dpi) if dpi else None))
+    return formats
+
+
+def svg_to_formats(
+    content_svg,
+    formats: Iterable[tuple[str, Optional[int]]],
+    dpi=300,
+    use_local=True,
+    use_pool=False,
+    backend=None,
+) -> dict[tuple[str, Optional[int]], bytes]:
+    """Converts SVG content to several (extension, dpi) formats in one pass.
+
+    PNG/JPG are rasterized once at the highest dpi and resampled for the lower
+    ones, and other formats are converted from the same SVG. Formats without a
+    dpi use `dpi`.
+    """
+    formats = list(formats)
+    outputs = {}
+    raster_dpis = [
+        format_dpi or dpi
+        for extension, format_dpi in formats
+        if extension in RASTER_EXTENSIONS
+    ]
+    if raster_dpis:
+        raster_dpi = max(raster_dpis)
+        raster = backends.rasterize(
+            content_svg,
+            raster_dpi,
+            backends.resolve_backend("png", backend, use_local, use_pool),
+        )
+    for extension, format_dpi in formats:
+        if extension in RASTER_EXTENSIONS:
+            outputs[(extension, format_dpi)] = _encode_raster(
+                raster, extension, format_dpi or dpi, raster_dpi
+            )
+        else:
+            outputs[(extension, format_dpi)] = svg_to_bytes(
+                content_svg, extension, format_dpi or dpi, use_local, use_pool, backend
+            )
+    return outputs
+
+
+def _encode_raster(img, extension, dpi, raster_dpi) -> bytes:
+    from io import BytesIO
+
+    from PIL import Image
+
+    if dpi != raster_dpi:
+        size = (
+            max(1, round(img.width * dpi / raster_dpi)),
+            max(1, round(img.height * dpi / raster_dpi)),
+        )
+        img = img.resize(size, Image.Resampling.LANCZOS)
+    if extension == "jpg" and img.mode in ("RGBA", "LA"):
+        bg = Image.new("RGB", img.size, (255, 255, 255))
+        bg.paste(img, img)
+        img = bg
+    buffer = BytesIO()
+    img.save(buffer, "JPEG" if extension == "jpg" else "PNG", dpi=(dpi, dpi))
+    return buffer.getvalue()
+
 
 if __name__ == "__main__":
     import argparse
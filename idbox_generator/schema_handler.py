@@ -1,7 +1,12 @@
 import dataclasses
+from typing import Optional
+
 from .datamatrix import str_to_datamatrix, id_to_aruco_tiles
 from .types import (
+    EMPTY_TILE_GRID,
     IdBoxSchema,
+    IdBoxSchemaCustomFieldDefs,
+    IdBoxSchemaHeader,
     SvgBubbleParam,
     SvgColumnParam,
     SvgHeaderParam,
@@ -33,7 +38,7 @@ def parse_schema_to_svg_params(schema: IdBoxSchema) -> SvgParams:
     data_matrix_tiles = (
         str_to_datamatrix(schema.data_matrix_text)
         if schema.data_matrix_text != ""
-        else []
+        else EMPTY_TILE_GRID
     )
     aruco_stub_tiles = id_to_aruco_tiles(schema.aruco_stub_id)
 
@@ -42,7 +47,7 @@ def parse_schema_to_svg_params(schema: IdBoxSchema) -> SvgParams:
         2 * header.height + HEIGHT_WRITING + num_rows * HEIGHT_BUBBLE_BOX_DEFAULT
     )
 
-    return SvgParams(
+    params = SvgParams(
         width_max=WIDTH_MAX,
         height_max=HEIGHT_MAX,
         width_box=WIDTH_BUBBLE_BOX_DEFAULT,
@@ -82,6 +87,95 @@ def parse_schema_to_svg_params(schema: IdBoxSchema) -> SvgParams:
         ],
         default_value_position_size_triplets=[],
     )
+    return params
+
+
+def parse_schema_dict(data: dict) -> IdBoxSchema:
+    """Builds an IdBoxSchema from its JSON representation."""
+    data = dict(data)
+    data["header"] = IdBoxSchemaHeader(**data.get("header", {}))
+    data["fields"] = [
+        IdBoxSchemaCustomFieldDefs(**field_def) for field_def in data.get("fields", [])
+    ]
+    return IdBoxSchema(**data)
+
+
+def vary_svg_params(
+    params: SvgParams,
+    data_matrix_text: Optional[str] = None,
+    aruco_stub_id: Optional[int] = None,
+    default_values: Optional[list[str]] = None,
+) -> SvgParams:
+    """Returns a copy of params with the per-student parts replaced.
+
+    The layout is left untouched, so a schema only needs to be parsed once for
+    a whole batch of students. Arguments left as None keep their current value.
+    """
+    top_left, bot_right = params.data_matrices
+    if data_matrix_text is not None:
+        top_left = dataclasses.replace(
+            top_left,
+            tiles=str_to_datamatrix(data_matrix_text)
+            if data_matrix_text != ""
+            else EMPTY_TILE_GRID,
+        )
+    if aruco_stub_id is not None:
+        bot_right = dataclasses.replace(
+            bot_right, tiles=id_to_aruco_tiles(aruco_stub_id)
+        )
+
+    columns = params.columns
+    default_value_position_size_triplets = params.default_value_position_size_triplets
+    if default_values is not None:
+        columns = _shade_columns(columns, default_values)
+        default_value_position_size_triplets = _default_value_triplets(
+            columns, default_values
+        )
+
+    return dataclasses.replace(
+        params,
+        columns=columns,
+        data_matrices=[top_left, bot_right],
+        default_value_position_size_triplets=default_value_position_size_triplets,
+    )
+
+
+def _shade_columns(
+    columns: list[SvgColumnParam], default_values: list[str]
+) -> list[SvgColumnParam]:
+    shaded_columns: list[SvgColumnParam] = []
+    for column in columns:
+        default_value = (
+            default_values[column.fieldIndex]
+            if column.fieldIndex < len(default_values)
+            else ""
+        )
+        values = [
+            dataclasses.replace(
+                bubble, isShaded=default_value != "" and bubble.value == default_value
+            )
+            for bubble in column.values
+        ]
+        shaded_columns.append(dataclasses.replace(column, values=values))
+    return shaded_columns
+
+
+def _default_value_triplets(
+    columns: list[SvgColumnParam], default_values: list[str]
+) -> list[tuple[str, float, int]]:
+    # position is the horizontal center of the field, in units of box width
+    field_spans: dict[int, list[int]] = {}
+    for i, column in enumerate(columns):
+        field_spans.setdefault(column.fieldIndex, []).append(i)
+
+    triplets = []
+    for field_index, default_value in enumerate(default_values):
+        if default_value == "" or field_index not in field_spans:
+            continue
+        span = field_spans[field_index]
+        position = span[0] + len(span) / 2
+        triplets.append((default_value, position, columns[span[0]].fontSize))
+    return triplets
 
 
 def _parse_schema_fields(schema: IdBoxSchema) -> list[SvgColumnParam]:
@@ -0,0 +1,163 @@
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from .template_cache import DEFAULT_TEMPLATE_NAME, get_template
+from .types import SvgParams
+
+SVG_END_TAG = "</svg>"
+# number of schemas whose static layer is kept by get_stamp
+CACHE_SIZE = 32
+
+
+def static_key(params: SvgParams) -> tuple:
+    """Returns a key identifying everything in params that is the same for every student."""
+    return (
+        params.width_max,
+        params.height_max,
+        params.width_box,
+        params.height_box,
+        params.height_writing,
+        params.footer_height,
+        tuple(_vars_of(params.header)),
+        tuple(
+            (
+                tuple(_vars_of(column, exclude=("values",))),
+                tuple(
+                    tuple(_vars_of(bubble, exclude=("isShaded",)))
+                    for bubble in column.values
+                ),
+            )
+            for column in params.columns
+        ),
+        tuple(
+            tuple(_vars_of(data_matrix, exclude=("tiles",)))
+            for data_matrix in params.data_matrices
+        ),
+    )
+
+
+def _vars_of(obj, exclude=()) -> list:
+    return [getattr(obj, name) for name in obj.__slots__ if name not in exclude]
+
+
+def can_stamp(params: SvgParams) -> bool:
+    """Returns whether the per-student parts of params stay clear of its static layer.
+
+    Markers are placed for the default header height (see schema_handler), so
+    under a shorter header they cross the header grid line and the default
+    values, and splicing them in last would draw them in the wrong order.
+    """
+    footer_top = params.height_max - params.footer_height
+    return all(
+        data_matrix.top + data_matrix.height + data_matrix.margin
+        <= params.header.height
+        or data_matrix.top - data_matrix.margin >= footer_top
+        for data_matrix in params.data_matrices
+    )
+
+
+class SvgStamp:
+    """The static layer of a box, rendered once and stamped with each student's parts.
+
+    Everything identical for every student of a schema (fills, unshaded bubbles,
+    labels, header, footer and grid lines) is rendered once. Each variant then
+    only renders its shaded bubbles, default values and marker tiles, which are
+    spliced in before the closing </svg> tag. Params whose parts would overlap
+    (see can_stamp) are rendered in full instead.
+    """
+
+    def __init__(
+        self,
+        params: SvgParams,
+        template_name: str = DEFAULT_TEMPLATE_NAME,
+        marker_encoding: str = "path",
+    ):
+        self.template_name = template_name
+        self.marker_encoding = marker_encoding
+        self.is_stamped = can_stamp(params)
+        if not self.is_stamped:
+            return
+        content_static = get_template(template_name).render(
+            _context(params, marker_encoding, layer="static")
+        )
+        end = content_static.rindex(SVG_END_TAG)
+        self.head = content_static[:end]
+        self.tail = content_static[end:]
+
+    def render(self, params: SvgParams) -> str:
+        """Renders a variant of the params this stamp was created from."""
+        if not self.is_stamped:
+            return get_template(self.template_name).render(
+                _context(params, self.marker_encoding, layer=None)
+            )
+        context = {
+            "layer": "dynamic",
+            "marker_encoding": self.marker_encoding,
+            "shaded_bubbles": [
+                (i, j, column, bubble)
+                for i, column in enumerate(params.columns)
+                for j, bubble in enumerate(column.values)
+                if bubble.isShaded and not bubble.isHidden
+            ],
+            "default_value_position_size_triplets": params.default_value_position_size_triplets,
+            "data_matrices": params.data_matrices,
+            "header": params.header,
+            "width_box": params.width_box,
+            "height_box": params.height_box,
+            "height_writing": params.height_writing,
+        }
+        content_dynamic = get_template(self.template_name).render(context)
+        return self.head + content_dynamic + self.tail
+
+
+def _context(params: SvgParams, marker_encoding: str, layer: Optional[str]) -> dict:
+    context = {name: getattr(params, name) for name in params.__slots__}
+    context["marker_encoding"] = marker_encoding
+    context["layer"] = layer
+    return context
+
+
+_lock = threading.Lock()
+_stamps: "OrderedDict[Hashable, SvgStamp]" = OrderedDict()
+
+
+def get_stamp(
+    params: SvgParams,
+    cache_key: Optional[Hashable] = None,
+    template_name: str = DEFAULT_TEMPLATE_NAME,
+    marker_encoding: str = "path",
+) -> SvgStamp:
+    """Returns the cached stamp for the static layer of params.
+
+    `cache_key` identifies the schema, e.g. its filename. Without it, the key is
+    computed from the static parts of params, which walks every bubble.
+    """
+    key = (
+        cache_key if cache_key is not None else static_key(params),
+        template_name,
+        marker_encoding,
+    )
+    with _lock:
+        stamp = _stamps.get(key)
+        if stamp is not None:
+            _stamps.move_to_end(key)
+            return stamp
+
+    stamp = SvgStamp(params, template_name, marker_encoding)
+    with _lock:
+        _stamps[key] = stamp
+        while len(_stamps) > CACHE_SIZE:
+            _stamps.popitem(last=False)
+    return stamp
+
+
+def create_svg_stamped(
+    params: SvgParams,
+    cache_key: Optional[Hashable] = None,
+    template_name: str = DEFAULT_TEMPLATE_NAME,
+    marker_encoding: str = "path",
+) -> str:
+    """Same output as create_svg_from_params, reusing the static layer across variants."""
+    stamp = get_stamp(params, cache_key, template_name, marker_encoding)
+    return stamp.render(params)
@@ -0,0 +1,138 @@
+import os
+import threading
+from pathlib import Path
+from typing import Optional, Union
+
+from jinja2 import (
+    BaseLoader,
+    Environment,
+    FileSystemBytecodeCache,
+    Template,
+    TemplateNotFound,
+)
+
+from .types import TileGrid
+
+_CURRENT_DIR = Path(__file__).parent.absolute()
+_ASSET_DIR = _CURRENT_DIR / "assets"
+
+DEFAULT_TEMPLATE_NAME = "template.svg"
+# set to a directory to share compiled bytecode across worker processes
+ENV_BYTECODE_CACHE_DIR = "IDBOX_TEMPLATE_CACHE_DIR"
+
+
+class _RegistryLoader(BaseLoader):
+    """Loads templates from explicitly registered files, keyed by name."""
+
+    def __init__(self):
+        self.paths: dict[str, Path] = {
+            DEFAULT_TEMPLATE_NAME: _ASSET_DIR / DEFAULT_TEMPLATE_NAME,
+        }
+
+    def get_source(self, environment, template):
+        path = self.paths.get(template)
+        if path is None or not path.is_file():
+            raise TemplateNotFound(template)
+        mtime = path.stat().st_mtime
+        with open(path) as f:
+            source = f.read()
+        return source, str(path), lambda: path.stat().st_mtime == mtime
+
+
+_lock = threading.Lock()
+_loader = _RegistryLoader()
+_environment: Optional[Environment] = None
+_compiled: dict[str, Template] = {}
+_stats = {"hits": 0, "misses": 0}
+
+
+def get_environment() -> Environment:
+    global _environment
+    if _environment is None:
+        with _lock:
+            if _environment is None:
+                cache_dir = os.environ.get(ENV_BYTECODE_CACHE_DIR)
+                _environment = _create_environment(cache_dir)
+    return _environment
+
+
+def _create_environment(bytecode_cache_dir=None) -> Environment:
+    bytecode_cache = None
+    if bytecode_cache_dir:
+        os.makedirs(bytecode_cache_dir, exist_ok=True)
+        bytecode_cache = FileSystemBytecodeCache(str(bytecode_cache_dir))
+    environment = Environment(
+        loader=_loader,
+        bytecode_cache=bytecode_cache,
+        auto_reload=False,
+    )
+    environment.filters["marker_path"] = _marker_path
+    return environment
+
+
+def _marker_path(data_matrix) -> str:
+    from .datamatrix import tiles_to_path_data
+
+    tiles = data_matrix.tiles
+    # tiles_to_path_data is cached, so lists of lists of bools are packed first
+    if not isinstance(tiles, TileGrid):
+        tiles = TileGrid.from_tiles(tiles)
+    return tiles_to_path_data(
+        tiles,
+        data_matrix.left,
+        data_matrix.top,
+        data_matrix.width,
+        data_matrix.height,
+    )
+
+
+def set_bytecode_cache_dir(directory: Optional[Union[str, Path]]):
+    """Enables (or disables with None) the on-disk bytecode cache.
+
+    Compiled templates are kept in the directory, so that new worker processes
+    pointed at the same directory skip Jinja compilation entirely.
+    """
+    global _environment
+    with _lock:
+        _environment = _create_environment(directory)
+        _compiled.clear()
+
+
+def register_template(name: str, filepath: Union[str, Path]):
+    """Registers a custom template file to be served from the shared cache."""
+    with _lock:
+        _loader.paths[name] = Path(filepath).absolute()
+        _compiled.pop(name, None)
+
+
+def get_template(name: str = DEFAULT_TEMPLATE_NAME) -> Template:
+    template = _compiled.get(name)
+    if template is not None:
+        _stats["hits"] += 1
+        return template
+
+    environment = get_environment()
+    with _lock:
+        template = _compiled.get(name)
+        if template is None:
+            _stats["misses"] += 1
+            template = environment.get_template(name)
+            _compiled[name] = template
+        else:
+            _stats["hits"] += 1
+    return template
+
+
+def clear_template_cache():
+    with _lock:
+        _compiled.clear()
+        if _environment is not None:
+            _environment.cache.clear()
+
+
+def template_cache_stats() -> dict[str, int]:
+    return {
+        "hits": _stats["hits"],
+        "misses": _stats["misses"],
+        "size": len(_compiled),
+    }
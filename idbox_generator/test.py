@@ -53,3 +53,293 @@ def test():
     svg_params = parse_schema_to_svg_params(schema)
     svg_content = create_svg_from_params(svg_params)
     save_svg_to_file(svg_content, "test.png", "png")
+
+
+def test_docker_converter():
+    from pathlib import Path
+
+    from .docker_converter import DockerConverter, FakeDockerClient
+
+    def fake_inkscape(command):
+        # copies the input as output, standing in for inkscape inside the container
+        filename_output = command[3].split("=", 1)[1]
+        Path(filename_output).write_bytes(Path(command[-1]).read_bytes())
+        return 0, b""
+
+    client = FakeDockerClient(exec_handler=fake_inkscape)
+    with DockerConverter(client=client) as converter:
+        for i in range(3):
+            assert (
+                converter.convert(f"<svg>{i}</svg>", "png")
+                == f"<svg>{i}</svg>".encode()
+            )
+    actions = [call[0] for call in client.calls]
+    assert actions == ["run", "exec_run", "exec_run", "exec_run", "stop"], actions
+
+
+def test_cairo_parity(dpi=150):
+    # the cairo backend should be close enough to inkscape for scanning
+    import re
+    from io import BytesIO
+
+    import numpy as np
+    from PIL import Image
+
+    from .save_to import svg_to_bytes
+
+    schema = IdBoxSchema(
+        header=IdBoxSchemaHeader(value="STUDENT ID"),
+        data_matrix_text="abc",
+        aruco_stub_id=42,
+        fields=[
+            IdBoxSchemaCustomFieldDefs(values="0;1;2;3;4;5;6;7;8;9", defaultValue="3"),
+            IdBoxSchemaCustomFieldDefs(values="A;B;C", isEmbed=False),
+        ],
+    )
+    content_svg = create_svg_from_params(parse_schema_to_svg_params(schema))
+
+    images = []
+    for backend in ("cairo", "inkscape"):
+        content = svg_to_bytes(content_svg, "jpg", dpi=dpi, backend=backend)
+        with Image.open(BytesIO(content)) as img:
+            images.append(np.asarray(img.convert("L"), dtype=np.int16))
+    cairo_image, inkscape_image = images
+    assert abs(cairo_image.shape[0] - inkscape_image.shape[0]) <= 1
+    assert abs(cairo_image.shape[1] - inkscape_image.shape[1]) <= 1
+    height = min(cairo_image.shape[0], inkscape_image.shape[0])
+    width = min(cairo_image.shape[1], inkscape_image.shape[1])
+    difference = np.abs(cairo_image[:height, :width] - inkscape_image[:height, :width])
+    # anti-aliasing and font hinting differ, black/white flips should not
+    assert (difference > 128).mean() < 0.01, (difference > 128).mean()
+
+    media_boxes = [
+        re.search(
+            rb"/MediaBox \[\s*([\d.]+) ([\d.]+) ([\d.]+) ([\d.]+)",
+            svg_to_bytes(content_svg, "pdf", backend=backend),
+        ).groups()
+        for backend in ("cairo", "inkscape")
+    ]
+    cairo_box, inkscape_box = (list(map(float, box)) for box in media_boxes)
+    assert np.allclose(cairo_box, inkscape_box, atol=1), media_boxes
+
+
+def test_raster_parity():
+    # the direct rasterizer should match cairosvg closely enough for scanning
+    from io import BytesIO
+
+    import numpy as np
+    from PIL import Image
+
+    from .converter import convert_svg_to_png
+    from .raster import rasterize_params
+
+    schema = IdBoxSchema(
+        header=IdBoxSchemaHeader(value="STUDENT ID", fill="#000000", color="#ffffff"),
+        data_matrix_text="abc",
+        aruco_stub_id=42,
+        fields=[
+            IdBoxSchemaCustomFieldDefs(values="0;1;2;3;4;5;6;7;8;9", defaultValue="3"),
+            IdBoxSchemaCustomFieldDefs(values="A;B;C", isEmbed=False),
+            IdBoxSchemaCustomFieldDefs(values=";1;2", hideCircle=True),
+        ],
+    )
+    svg_params = parse_schema_to_svg_params(schema)
+
+    def on_white(img):
+        bg = Image.new("RGBA", img.size, (255, 255, 255, 255))
+        return np.asarray(Image.alpha_composite(bg, img).convert("L"), dtype=np.int16)
+
+    with Image.open(
+        BytesIO(convert_svg_to_png(create_svg_from_params(svg_params)))
+    ) as img:
+        expected = on_white(img.convert("RGBA"))
+    actual = on_white(rasterize_params(svg_params))
+    assert actual.shape == expected.shape, (actual.shape, expected.shape)
+    difference = np.abs(actual - expected)
+    # anti-aliasing and font rendering differ, black/white flips should not
+    assert (difference > 128).mean() < 0.02, (difference > 128).mean()
+    assert difference.mean() < 16, difference.mean()
+
+
+# modules an svg-only CLI call must not import, loaded lazily where needed
+HEAVY_MODULES = ("numpy", "pylibdmtx", "docker", "cv2", "PIL", "cairosvg", "cairocffi")
+
+
+def test_import_time(budget_ms=150, module="idbox_generator.generate", runs=3):
+    # `generate ... -e svg` should only pay for jinja2 on startup
+    import re
+    import subprocess
+    import sys
+
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        imported = {}
+        for line in output.stderr.splitlines():
+            match = re.match(r"import time:\s*\d+ \|\s*(\d+) \|\s*(\S+)", line)
+            if match:
+                imported[match.group(2)] = int(match.group(1))
+        heavy = [name for name in imported if name.split(".")[0] in HEAVY_MODULES]
+        assert not heavy, f"{module} imports {heavy}"
+        # cumulative microseconds, including the package and everything imported
+        timings.append(imported[module])
+    # the fastest run, as the others include noise from the machine
+    assert (
+        min(timings) / 1000 < budget_ms
+    ), f"{module} imports in {min(timings) / 1000:.0f}ms"
+
+
+def test_async_render(concurrency=2, num_boxes=8):
+    # renders match create_svg_from_params, with at most `concurrency` at once,
+    # from a renderer created outside of the loops it runs in
+    import asyncio
+    import threading
+    import time
+    from concurrent.futures import ThreadPoolExecutor
+
+    from .aio import AsyncRenderer, render
+
+    lock = threading.Lock()
+    calls = {"active": 0, "peak": 0}
+
+    class CountingExecutor(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            def run():
+                with lock:
+                    calls["active"] += 1
+                    calls["peak"] = max(calls["peak"], calls["active"])
+                try:
+                    time.sleep(0.01)
+                    return fn(*args, **kwargs)
+                finally:
+                    with lock:
+                        calls["active"] -= 1
+
+            return super().submit(run)
+
+    schemas = [
+        IdBoxSchema(
+            header=IdBoxSchemaHeader(value="STUDENT ID"),
+            aruco_stub_id=i,
+            fields=[
+                IdBoxSchemaCustomFieldDefs(values="0;1;2", defaultValue=str(i % 3))
+            ],
+        )
+        for i in range(num_boxes)
+    ]
+    expected = [
+        create_svg_from_params(parse_schema_to_svg_params(schema)).encode()
+        for schema in schemas
+    ]
+
+    with CountingExecutor(max_workers=num_boxes) as executor:
+        renderer = AsyncRenderer(concurrency=concurrency, executor=executor)
+
+        async def render_all():
+            return await asyncio.gather(
+                *(renderer.render(schema) for schema in schemas)
+            )
+
+        for _ in range(2):
+            assert asyncio.run(render_all()) == expected
+    assert calls["peak"] == concurrency, calls
+    assert asyncio.run(render(schemas[0])) == expected[0]
+
+
+def test_layout_manifest():
+    # bubbles of a known schema, placed relative to the data matrix and aruco
+    from io import BytesIO
+
+    import numpy as np
+
+    from .layout import layout_manifest, manifest_to_npz
+
+    schema = IdBoxSchema(
+        header=IdBoxSchemaHeader(value="STUDENT ID"),
+        data_matrix_text="abc",
+        aruco_stub_id=42,
+        fields=[
+            IdBoxSchemaCustomFieldDefs(values="0;1;2"),
+            IdBoxSchemaCustomFieldDefs(values=";1;2"),
+            IdBoxSchemaCustomFieldDefs(values="A;B", isEmbed=False),
+        ],
+    )
+    svg_params = parse_schema_to_svg_params(schema)
+    manifest = layout_manifest(svg_params)
+    bubbles = manifest["bubbles"]
+
+    assert (manifest["width"], manifest["height"]) == (90, 210), manifest
+    assert bubbles["field"] == [0, 0, 0, 1, 1, 1, 2, 2], bubbles["field"]
+    assert bubbles["value"] == ["0", "1", "2", "", "1", "2", "A", "B"]
+    assert bubbles["center_x"] == [15, 15, 15, 45, 45, 45, 75, 75]
+    assert bubbles["center_y"] == [95, 125, 155] * 2 + [95, 125]
+    assert all(len(values) == 8 for values in bubbles.values()), bubbles
+
+    # (0, 0) is the top-left of the data matrix, (1, 1) the bottom-right of the aruco
+    data_matrix, aruco = (
+        manifest["anchors"]["data_matrix"],
+        manifest["anchors"]["aruco"],
+    )
+    assert (data_matrix["left"], data_matrix["top"]) == (
+        svg_params.data_matrices[0].left,
+        svg_params.data_matrices[0].top,
+    )
+    right = aruco["left"] + aruco["width"]
+    bottom = aruco["top"] + aruco["height"]
+    for x, y, u, v in zip(
+        bubbles["center_x"],
+        bubbles["center_y"],
+        bubbles["anchor_u"],
+        bubbles["anchor_v"],
+    ):
+        assert np.isclose(data_matrix["left"] + u * (right - data_matrix["left"]), x)
+        assert np.isclose(data_matrix["top"] + v * (bottom - data_matrix["top"]), y)
+    # the middle column is halfway between the markers
+    assert np.isclose(bubbles["anchor_u"][3], 0.5), bubbles["anchor_u"]
+
+    with np.load(BytesIO(manifest_to_npz(svg_params))) as arrays:
+        assert arrays["bubble_value"].tolist() == bubbles["value"]
+        assert np.allclose(arrays["bubble_anchor_v"], bubbles["anchor_v"])
+        assert np.allclose(arrays["anchors"][1, :2], [aruco["left"], aruco["top"]])
+
+
+def test_stamp_header(header_heights=(40, 60, 24)):
+    # stamping should look the same as a full render, whatever the header height
+    import numpy as np
+
+    from .raster import RasterStamp, rasterize_params
+    from .schema_handler import vary_svg_params
+    from .stamp import SvgStamp, can_stamp
+
+    for height in header_heights:
+        schema = IdBoxSchema(
+            header=IdBoxSchemaHeader(value="STUDENT ID", height=height),
+            data_matrix_text="abc",
+            aruco_stub_id=42,
+            fields=[
+                IdBoxSchemaCustomFieldDefs(values="0;1;2", defaultValue="1"),
+                IdBoxSchemaCustomFieldDefs(values="A;B", isEmbed=False),
+            ],
+        )
+        svg_params = parse_schema_to_svg_params(schema)
+        variant = vary_svg_params(
+            svg_params,
+            data_matrix_text="xyz",
+            aruco_stub_id=7,
+            default_values=["2", "B"],
+        )
+        assert can_stamp(svg_params) == (height >= 40), height
+
+        content_svg = SvgStamp(svg_params).render(variant)
+        if not can_stamp(svg_params):
+            assert content_svg == create_svg_from_params(variant), height
+
+        expected = np.asarray(rasterize_params(variant), dtype=np.int16)
+        actual = np.asarray(RasterStamp(svg_params).render(variant), dtype=np.int16)
+        # only the anti-aliased edges of shaded bubbles drawn over unshaded ones differ
+        assert (np.abs(actual - expected) > 128).mean() < 0.001, height
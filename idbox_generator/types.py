@@ -1,5 +1,5 @@
 from dataclasses import dataclass, field
-from typing import Optional
+from typing import Iterator, Optional, Sequence
 
 
 @dataclass
@@ -39,6 +39,15 @@ class IdBoxSchema:
 
 @dataclass
 class SvgHeaderParam:
+    __slots__ = (
+        "value",
+        "height",
+        "fontWeight",
+        "fontSize",
+        "fill",
+        "color",
+    )
+
     value: str
     height: float
     fontWeight: str
@@ -49,6 +58,17 @@ class SvgHeaderParam:
 
 @dataclass
 class SvgBubbleParam:
+    __slots__ = (
+        "value",
+        "center_x",
+        "center_y",
+        "radius_x",
+        "radius_y",
+        "isHidden",
+        "isShaded",
+        "isLabel",
+    )
+
     value: str
     center_x: float
     center_y: float
@@ -61,6 +81,18 @@ class SvgBubbleParam:
 
 @dataclass
 class SvgColumnParam:
+    __slots__ = (
+        "fieldIndex",
+        "values",
+        "fontSize",
+        "fontWeight",
+        "isEmbed",
+        "color",
+        "fill",
+        "hasDivider",
+        "hideCircle",
+    )
+
     fieldIndex: int
     values: list[SvgBubbleParam]
     fontSize: int
@@ -72,9 +104,96 @@ class SvgColumnParam:
     hideCircle: bool
 
 
+class TileGrid:
+    """Immutable grid of marker tiles, where True is a white tile.
+
+    Tiles are bit-packed row-major, most significant bit first (as
+    numpy.packbits), and iterating yields each row as a tuple of bools.
+    """
+
+    __slots__ = ("num_rows", "num_columns", "packed", "_rows")
+
+    def __init__(self, num_rows: int, num_columns: int, packed: bytes):
+        self.num_rows = num_rows
+        self.num_columns = num_columns
+        self.packed = packed
+        self._rows: Optional[tuple[tuple[bool, ...], ...]] = None
+
+    @classmethod
+    def from_tiles(cls, tiles: Sequence[Sequence[bool]]) -> "TileGrid":
+        bits = [bool(tile) for row in tiles for tile in row]
+        packed = bytearray((len(bits) + 7) // 8)
+        for i, bit in enumerate(bits):
+            if bit:
+                packed[i >> 3] |= 0x80 >> (i & 7)
+        return cls(len(tiles), len(tiles[0]) if tiles else 0, bytes(packed))
+
+    @property
+    def rows(self) -> tuple[tuple[bool, ...], ...]:
+        if self._rows is None:
+            packed = self.packed
+            self._rows = tuple(
+                tuple(
+                    bool(packed[i >> 3] & (0x80 >> (i & 7)))
+                    for i in range(r * self.num_columns, (r + 1) * self.num_columns)
+                )
+                for r in range(self.num_rows)
+            )
+        return self._rows
+
+    def __len__(self) -> int:
+        return self.num_rows
+
+    def __iter__(self) -> Iterator[tuple[bool, ...]]:
+        return iter(self.rows)
+
+    def __getitem__(self, index):
+        return self.rows[index]
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, TileGrid):
+            return (self.num_rows, self.num_columns, self.packed) == (
+                other.num_rows,
+                other.num_columns,
+                other.packed,
+            )
+        return [list(row) for row in self.rows] == other
+
+    def __hash__(self) -> int:
+        return hash((self.num_rows, self.num_columns, self.packed))
+
+    def __repr__(self) -> str:
+        return f"TileGrid({self.num_rows}, {self.num_columns}, {self.packed!r})"
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
+
+    def __getstate__(self):
+        return (self.num_rows, self.num_columns, self.packed)
+
+    def __setstate__(self, state):
+        self.num_rows, self.num_columns, self.packed = state
+        self._rows = None
+
+
+EMPTY_TILE_GRID = TileGrid(0, 0, b"")
+
+
 @dataclass
 class SvgDatamatrixParam:
-    tiles: list[list[bool]]
+    __slots__ = (
+        "tiles",
+        "left",
+        "top",
+        "width",
+        "height",
+        "margin",
+    )
+
+    tiles: TileGrid
     left: float
     top: float
     width: float
@@ -84,6 +203,22 @@ class SvgDatamatrixParam:
 
 @dataclass
 class SvgParams:
+    __slots__ = (
+        "width_max",
+        "height_max",
+        "width_box",
+        "height_box",
+        "width_bubble",
+        "height_bubble",
+        "height_writing",
+        "height_text_offset",
+        "columns",
+        "header",
+        "footer_height",
+        "data_matrices",
+        "default_value_position_size_triplets",
+    )
+
     width_max: float
     height_max: float
     width_box: float